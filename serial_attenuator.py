@@ -6,18 +6,84 @@ WCS串口衰减器控制器
 """
 
 import serial
-import serial.tools.list_ports
 import time
 import threading
+from concurrent.futures import ThreadPoolExecutor
 import logging
+import math
 import os
+import re
 import json
+import numpy as np
 from typing import List, Dict, Optional, Tuple
 
+# 优先使用orjson解析JSON（C实现，速度更快），未安装时回退到标准库
+try:
+    import orjson
+    _json_loads = orjson.loads
+
+    def _json_dumps_pretty(obj) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+except ImportError:
+    _json_loads = json.loads
+
+    def _json_dumps_pretty(obj) -> bytes:
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 补偿结果缓存的最大条目数
+_COMPENSATE_CACHE_SIZE = 1024
+# 补偿结果缓存键中衰减值保留的小数位数（3位即0.001dB以内的输入共用同一结果，减小该值可放宽命中容差）
+_COMPENSATE_CACHE_DECIMALS = 3
+
+# 按频率缓存的最小衰减值的最大条目数（在多个工作频率间来回切换时无需重新插值）
+_MIN_ATT_CACHE_SIZE = 256
+
+# 检查补偿文件是否被修改的最小时间间隔（秒）
+_RELOAD_CHECK_INTERVAL = 0.5
+# 串口设备信息的有效期（秒），期间连接设备不重新枚举串口
+_DEVICE_INFO_TTL = 5.0
+# 批量串口操作线程池的最大线程数（同时并发收发的设备数上限）
+_IO_MAX_WORKERS = 16
+
+# 已解析的补偿文件缓存（所有FrequencyCompensator实例共享）:
+# 真实路径 -> ((inode, 修改时间纳秒), 原始JSON, 查表数据, 排序后的频率数组)
+_COMPENSATION_CACHE: Dict[str, Tuple[Tuple[int, int], Dict, Dict[float, Dict], np.ndarray]] = {}
+_COMPENSATION_CACHE_LOCK = threading.Lock()
+
+# 设置衰减值的命令模板（bytes格式化，省去字符串拼接和编码）
+_ATT_COMMAND = b"att-%06.2f\r\n"
+
+# 从端口名中提取端口号的正则表达式
+_ACM_RE = re.compile(r'ACM(\d+)')
+_COM_RE = re.compile(r'COM(\d+)', re.IGNORECASE)
+
+# STM32F4 CDC ACM虚拟串口在Linux下的设备名前缀（扫描串口时只列出这类设备）
+_ACM_PORT_PREFIX = '/dev/ttyACM'
+# USB虚拟串口（CDC ACM和USB转串口芯片）在Linux下的设备名前缀
+_HIGH_SPEED_PORT_PREFIXES = (_ACM_PORT_PREFIX, '/dev/ttyUSB')
+
+
+def _baudrate_for_port(port: str) -> int:
+    """根据端口名选择波特率：USB虚拟串口使用115200，其余（包括无法区分类型的Windows COMx端口）使用9600"""
+    if port.startswith(_HIGH_SPEED_PORT_PREFIXES):
+        return 115200
+    return 9600
+
+
+def _parse_port_number(port: str, marker: str, pattern: re.Pattern) -> Optional[int]:
+    """提取端口名中marker之后的端口号，如 /dev/ttyACM0 -> 0，无法识别时返回None"""
+    # 常见格式（标记位于末尾且后面全是数字）直接切片，无需正则
+    if marker in port:
+        tail = port.rsplit(marker, 1)[1]
+        if tail.isdigit():
+            return int(tail)
+    match = pattern.search(port)
+    return int(match.group(1)) if match else None
+
 
 class FrequencyCompensator:
     """频率补偿器 - 处理频率相关的插入损耗补偿"""
@@ -29,12 +95,28 @@ class FrequencyCompensator:
         else:
             self.compensation_file = compensation_file
         self.frequency_data = {}
+        self._freq_np = None  # 排序后的频率数组（用于插值）
+        self._loss_np = None  # 与频率数组对应的插入损耗数组
         self.current_frequency = 1000.0  # 默认频率 1000MHz
-        self.last_modified_time = 0  # 记录文件最后修改时间
+        self.last_modified_time = 0  # 记录文件最后修改时间（纳秒，st_mtime_ns）
+        self._file_ino = 0  # 记录文件inode，文件被替换时即使修改时间未变也能检测到
+        self._last_stat_check = 0.0  # 上次检查文件修改时间的时刻（monotonic）
+        self._json_cache = None  # 已解析的补偿文件内容
+        self._json_cache_sig: Optional[Tuple[int, int]] = None  # 缓存对应的文件签名(inode, 修改时间纳秒)
+        self._tables: Dict[float, Dict] = {}  # 每个频率的补偿数据（已转换为float）及预先排序好的查表数组
+        self._freq_keys_sorted = np.empty(0)  # 补偿文件中按大小排序的频率
+        self._min_att_cache: Dict[float, float] = {}  # 频率 -> 最小衰减值
+        self._min_att_cache_mtime = None  # _min_att_cache对应的文件修改时间
+        self._loss_cache: Optional[Tuple[float, float, float]] = None  # (频率, 文件修改时间, 当前频率的插入损耗)
+        self._compensate_cache: Dict[Tuple[float, float], float] = {}  # (频率, 显示值) -> 实际值
+        self._compensate_read_cache: Dict[Tuple[float, float], float] = {}  # (频率, 实际值) -> 显示值
+        self._freq_table_cache: Optional[Tuple[float, Dict]] = None  # (频率, 该频率选用的查表数据)
         self.load_frequency_data()
 
     def load_frequency_data(self):
         """从补偿文件加载频率-损耗数据，支持JSON格式"""
+        self._min_att_cache.clear()
+        self._loss_cache = None
         try:
             # 检查文件是否存在
             if not os.path.exists(self.compensation_file):
@@ -43,7 +125,9 @@ class FrequencyCompensator:
                 return
 
             # 更新文件修改时间
-            self.last_modified_time = os.path.getmtime(self.compensation_file)
+            st = os.stat(self.compensation_file)
+            self.last_modified_time = st.st_mtime_ns
+            self._file_ino = st.st_ino
 
             # 根据文件扩展名选择加载方式
             if self.compensation_file.endswith('.json'):
@@ -54,6 +138,9 @@ class FrequencyCompensator:
 
         except Exception as e:
             logger.error(f"加载补偿数据失败: {e}")
+            # 清除已记录的文件签名，下一次文件检查时重新尝试加载
+            self.last_modified_time = 0
+            self._file_ino = 0
             self._use_default_data()
 
     def _use_default_data(self):
@@ -69,52 +156,139 @@ class FrequencyCompensator:
             7006: -11.99,
             8000: -13.88
         }
+        self._update_loss_arrays()
+        # 默认数据只用于插入损耗查询，同时清除旧的补偿查表数据，补偿时报错而不是沿用过期数据
+        self._tables = {}
+        self._freq_keys_sorted = np.empty(0)
+        self._json_cache = None
+        self._json_cache_sig = None
+        self._clear_compensate_cache()
         logger.info("使用默认频率数据")
 
+    def _get_json_data(self) -> Dict:
+        """获取补偿文件的解析结果，仅在文件签名（inode和修改时间）变化时重新读取"""
+        st = os.stat(self.compensation_file)
+        signature = (st.st_ino, st.st_mtime_ns)
+        if signature != self._json_cache_sig:
+            json_data, self._tables, self._freq_keys_sorted = self._load_compensation(self.compensation_file, signature)
+            self._json_cache = json_data
+            self._json_cache_sig = signature
+            self._clear_compensate_cache()
+        return self._json_cache
+
+    @classmethod
+    def _load_compensation(cls, path: str, signature: Tuple[int, int]) -> Tuple[Dict, Dict[float, Dict], np.ndarray]:
+        """解析补偿文件并构建查表数据，结果按文件真实路径在所有实例间共享（只读），文件变化后重新解析"""
+        key = os.path.realpath(path)
+        cached = _COMPENSATION_CACHE.get(key)
+        if cached is not None and cached[0] == signature:
+            return cached[1], cached[2], cached[3]
+
+        with open(path, 'rb') as f:
+            json_data = _json_loads(f.read())
+        tables = cls._build_tables(json_data)
+        freq_keys_sorted = np.array(sorted(tables), dtype=np.float64)
+        with _COMPENSATION_CACHE_LOCK:
+            _COMPENSATION_CACHE[key] = (signature, json_data, tables, freq_keys_sorted)
+        return json_data, tables, freq_keys_sorted
+
+    def _find_closest_freq(self, frequency: float) -> float:
+        """二分查找补偿文件中与指定频率最接近的频率"""
+        keys = self._freq_keys_sorted
+        idx = int(np.searchsorted(keys, frequency))
+        if idx >= len(keys):
+            idx = len(keys) - 1
+        elif idx > 0 and frequency - keys[idx - 1] <= keys[idx] - frequency:
+            idx -= 1
+        return float(keys[idx])
+
+    @staticmethod
+    def _find_exact_index(sorted_values: np.ndarray, value: float, tolerance: float = 0.01) -> Optional[int]:
+        """在排序数组中查找与value误差小于tolerance的最近元素下标，没有则返回None"""
+        idx = int(np.searchsorted(sorted_values, value))
+        if idx >= len(sorted_values) or (idx > 0 and value - sorted_values[idx - 1] <= sorted_values[idx] - value):
+            idx -= 1
+        if idx >= 0 and abs(sorted_values[idx] - value) < tolerance:
+            return idx
+        return None
+
+    def _clear_compensate_cache(self):
+        """清空补偿结果缓存（频率或补偿文件变化时调用）"""
+        self._compensate_cache.clear()
+        self._compensate_read_cache.clear()
+        self._freq_table_cache = None
+
+    @staticmethod
+    def _build_tables(json_data: Dict) -> Dict[float, Dict]:
+        """解析时统一将频率和衰减值转换为float，并为每个频率预先构建按显示值和按实际值排序的查表数组"""
+        tables = {}
+        for freq_str, freq_data in json_data.items():
+            points = {float(k): float(v) for k, v in freq_data.items()}
+            count = len(points)
+            actual = np.fromiter(points.keys(), dtype=np.float64, count=count)
+            display = np.fromiter(points.values(), dtype=np.float64, count=count)
+            # 与原先 sorted(zip(...)) 的排序规则保持一致
+            order_d = np.lexsort((actual, display))
+            order_a = np.lexsort((display, actual))
+            tables[float(freq_str)] = {
+                "points": points,
+                "by_display": (display[order_d], actual[order_d]),
+                "by_actual": (actual[order_a], display[order_a]),
+            }
+        return tables
+
     def _load_json_data(self):
         """从JSON文件加载补偿数据"""
-        with open(self.compensation_file, 'r', encoding='utf-8') as f:
-            json_data = json.load(f)
-        
-        self.frequency_data.clear()
+        self._get_json_data()
         
         # JSON格式: {"频率": {"实际衰减值": "显示衰减值", ...}, ...}
-        for freq_str, attenuation_map in json_data.items():
-            frequency = float(freq_str)
-            # 将衰减值映射转换为插入损耗数据
-            # 插入损耗 = 显示衰减值 - 实际衰减值
-            for actual_str, display_value in attenuation_map.items():
-                actual_value = float(actual_str)
-                display_value = float(display_value)
-                # 计算插入损耗（负值）
-                insertion_loss = display_value - actual_value
-                
-                # 存储频率对应的插入损耗（使用实际衰减值0作为基准）
-                if actual_value == 0.0:
-                    self.frequency_data[frequency] = insertion_loss
-                    break
+        # 频率和衰减值已在解析时统一转换为float
+        # 插入损耗 = 显示衰减值 - 实际衰减值，使用实际衰减值0作为基准
+        # 一次遍历构建新字典后整体替换，不在原字典上逐项增删
+        new_data = {}
+        for frequency, table in self._tables.items():
+            points = table["points"]
+            if 0.0 in points:
+                new_data[frequency] = points[0.0]
         
         # 如果没有找到0dB的基准点，使用第一个数据点
-        if not self.frequency_data:
-            for freq_str, attenuation_map in json_data.items():
-                frequency = float(freq_str)
-                first_actual = list(attenuation_map.keys())[0]
-                first_display = list(attenuation_map.values())[0]
-                insertion_loss = float(first_display) - float(first_actual)
-                self.frequency_data[frequency] = insertion_loss
+        if not new_data:
+            for frequency, table in self._tables.items():
+                first_actual, first_display = next(iter(table["points"].items()))
+                new_data[frequency] = first_display - first_actual
         
+        self.frequency_data = new_data
+        self._update_loss_arrays()
         logger.info(f"成功从JSON加载 {len(self.frequency_data)} 个频率点的补偿数据")
     
 
     
+    def _update_loss_arrays(self):
+        """根据frequency_data重建排序后的频率/插入损耗数组"""
+        frequencies = sorted(self.frequency_data.keys())
+        self._freq_np = np.array(frequencies, dtype=np.float64)
+        self._loss_np = np.array([self.frequency_data[f] for f in frequencies], dtype=np.float64)
+
+    @property
+    def file_signature(self) -> Tuple[int, int]:
+        """已加载补偿文件的签名 (inode, 修改时间纳秒)，文件被修改或替换后变化"""
+        return self._file_ino, self.last_modified_time
+
     def check_and_reload_if_modified(self):
-        """检查文件是否被修改，如果是则重新加载"""
+        """检查文件是否被修改，如果是则重新加载（两次检查之间至少间隔_RELOAD_CHECK_INTERVAL秒）"""
+        now = time.monotonic()
+        if now - self._last_stat_check < _RELOAD_CHECK_INTERVAL:
+            return False
+        self._last_stat_check = now
+
         try:
-            if not os.path.exists(self.compensation_file):
+            try:
+                st = os.stat(self.compensation_file)
+            except FileNotFoundError:
                 return False
 
-            current_modified_time = os.path.getmtime(self.compensation_file)
-            if current_modified_time > self.last_modified_time:
+            # 使用纳秒精度的修改时间和inode判断文件是否变化，只需一次stat调用
+            if st.st_mtime_ns != self.last_modified_time or st.st_ino != self._file_ino:
                 logger.info(f"检测到补偿数据文件 {self.compensation_file} 已更新，重新加载数据")
                 self.load_frequency_data()
                 return True
@@ -123,155 +297,142 @@ class FrequencyCompensator:
             logger.error(f"检查文件修改时间失败: {e}")
             return False
 
-    def get_loss_at_frequency(self, frequency: float) -> float:
-        """获取指定频率的插入损耗（线性插值）"""
+    def get_loss_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """获取按频率排序的(频率数组, 插入损耗数组)，加载数据时构建一次，供插入损耗和最小衰减值查询共用"""
         # 检查文件是否被修改，如果是则重新加载
         self.check_and_reload_if_modified()
+        return self._freq_np, self._loss_np
 
-        if frequency in self.frequency_data:
-            return self.frequency_data[frequency]
-
-        # 线性插值
-        frequencies = sorted(self.frequency_data.keys())
+    def get_loss_at_frequency(self, frequency: float) -> float:
+        """获取指定频率的插入损耗（线性插值）"""
+        freq_np, loss_np = self.get_loss_arrays()
 
-        if not frequencies:  # 如果没有数据
+        if freq_np is None or not len(freq_np):  # 如果没有数据
             logger.warning("没有频率数据，返回默认插入损耗 0.0dB")
             return 0.0
 
-        if frequency < frequencies[0]:
-            return self.frequency_data[frequencies[0]]
-        if frequency > frequencies[-1]:
-            return self.frequency_data[frequencies[-1]]
-
-        # 找到相邻的两个频率点
-        for i in range(len(frequencies) - 1):
-            f1, f2 = frequencies[i], frequencies[i + 1]
-            if f1 <= frequency <= f2:
-                loss1 = self.frequency_data[f1]
-                loss2 = self.frequency_data[f2]
-                # 线性插值
-                ratio = (frequency - f1) / (f2 - f1)
-                return loss1 + ratio * (loss2 - loss1)
+        # 当前工作频率的插入损耗按(频率, 文件修改时间)缓存
+        is_current = frequency == self.current_frequency
+        if is_current:
+            cache = self._loss_cache
+            if cache is not None and cache[0] == frequency and cache[1] == self.last_modified_time:
+                return cache[2]
+
+        # 线性插值（超出范围时使用端点值）
+        loss = float(np.interp(frequency, freq_np, loss_np))
+        if is_current:
+            self._loss_cache = (frequency, self.last_modified_time, loss)
+        return loss
+
+    def get_losses_at_frequencies(self, frequencies) -> np.ndarray:
+        """批量获取多个频率的插入损耗（一次np.interp完成全部插值）"""
+        freq_np, loss_np = self.get_loss_arrays()
+        frequencies = np.asarray(frequencies, dtype=np.float64)
+
+        if freq_np is None or not len(freq_np):  # 如果没有数据
+            logger.warning("没有频率数据，返回默认插入损耗 0.0dB")
+            return np.zeros_like(frequencies)
 
-        return 0.0
+        return np.interp(frequencies, freq_np, loss_np)
 
-    def compensate_attenuation(self, target_attenuation: float) -> float:
+    def compensate_attenuation(self, target_attenuation: float, frequency: Optional[float] = None) -> float:
         """
         根据用户输入的目标衰减值（显示值），查表获取实际需要设置的衰减值
-        输入：用户想要的衰减值（显示值）
+        输入：用户想要的衰减值（显示值），frequency为None时使用当前工作频率
         输出：衰减器实际需要设置的衰减值
         """
-        # 重新加载原始JSON数据进行查表（不依赖frequency_data进行早期检查）
-        with open(self.compensation_file, 'r', encoding='utf-8') as f:
-            json_data = json.load(f)
-        
-        # 查找当前频率的数据
-        freq_str = str(self.current_frequency)
-        if freq_str not in json_data:
-            # 尝试其他格式
-            freq_str = str(int(self.current_frequency))
-            if freq_str not in json_data:
-                # 查找最接近的频率
-                available_freqs = [float(f) for f in json_data.keys()]
-                if not available_freqs:
-                    logger.warning(f"补偿文件中没有任何频率数据，使用原始值")
-                    return target_attenuation
-                
-                closest_freq = min(available_freqs, key=lambda x: abs(x - self.current_frequency))
-                freq_str = str(closest_freq)
-                logger.warning(f"频率 {self.current_frequency} MHz 不在补偿数据中，使用最近频率 {closest_freq} MHz 的补偿数据")
-        
-        freq_data = json_data[freq_str]
-        
-        # 首先检查是否有精确匹配
-        for actual_str, display_val in freq_data.items():
-            if abs(display_val - target_attenuation) < 0.01:  # 精确匹配（误差小于0.01dB）
-                actual_value = float(actual_str)
-                logger.debug(f"精确匹配：目标显示值 {target_attenuation} -> 实际设置值 {actual_value}")
-                return actual_value
-        
-        # 如果没有精确匹配，使用线性插值
-        actual_values = [float(k) for k in freq_data.keys()]
-        display_values = [float(v) for v in freq_data.values()]
-        
-        # 按显示值排序
-        sorted_pairs = sorted(zip(display_values, actual_values))
-        sorted_display = [pair[0] for pair in sorted_pairs]
-        sorted_actual = [pair[1] for pair in sorted_pairs]
-        
-        # 检查目标值是否在范围内
-        if target_attenuation < min(sorted_display):
-            logger.warning(f"目标显示值 {target_attenuation} 小于最小值 {min(sorted_display)}，使用最小值对应的实际值")
-            return sorted_actual[0]
-        elif target_attenuation > max(sorted_display):
-            logger.warning(f"目标显示值 {target_attenuation} 大于最大值 {max(sorted_display)}，使用最大值对应的实际值")
-            return sorted_actual[-1]
-        
-        # 线性插值
-        import numpy as np
-        interpolated_actual = np.interp(target_attenuation, sorted_display, sorted_actual)
-        logger.debug(f"线性插值：目标显示值 {target_attenuation} -> 实际设置值 {interpolated_actual:.2f}")
-        return round(interpolated_actual, 2)
+        return self._compensate(target_attenuation, frequency, "by_display", self._compensate_cache, "目标显示值", "实际设置值")
 
-    def compensate_attenuation_for_reading(self, actual_attenuation: float) -> float:
+    def compensate_attenuation_for_reading(self, actual_attenuation: float, frequency: Optional[float] = None) -> float:
         """
         根据衰减器实际设置的衰减值，查表获取显示给用户的衰减值
-        输入：衰减器实际设置的衰减值
+        输入：衰减器实际设置的衰减值，frequency为None时使用当前工作频率
         输出：显示给用户的衰减值
         """
-        # 重新加载原始JSON数据进行查表（不依赖frequency_data进行早期检查）
-        with open(self.compensation_file, 'r', encoding='utf-8') as f:
-            json_data = json.load(f)
-        
-        # 查找当前频率的数据
-        freq_str = str(self.current_frequency)
-        if freq_str not in json_data:
-            # 尝试其他格式
-            freq_str = str(int(self.current_frequency))
-            if freq_str not in json_data:
+        return self._compensate(actual_attenuation, frequency, "by_actual", self._compensate_read_cache, "实际设置值", "显示值")
+
+    def _compensate(self, value: float, frequency: Optional[float], direction: str,
+                    cache: Dict[Tuple[float, float], float], x_name: str, y_name: str) -> float:
+        """双向查表的公共实现：direction为"by_display"时由显示值查实际值，为"by_actual"时由实际值查显示值"""
+        # NaN/inf无法查表，提前拒绝，避免生成无效的串口命令
+        if not math.isfinite(value):
+            raise ValueError(f"{x_name}必须是有限数值: {value}")
+
+        # 确保查表数据为最新（与插入损耗查询共用节流的文件检查，间隔内不访问文件系统）
+        self.check_and_reload_if_modified()
+
+        if frequency is None:
+            frequency = self.current_frequency
+
+        # 相同频率和输入值的结果直接从缓存返回
+        key = (frequency, round(value, _COMPENSATE_CACHE_DECIMALS))
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+        table = self._get_freq_table(frequency)
+        if table is None:
+            # 补偿文件缺失或无法解析时不能直接下发原始值，由调用方按设置/读取失败处理
+            if self._json_cache is None:
+                raise RuntimeError(f"补偿文件 {self.compensation_file} 未能加载，无法计算补偿值")
+            logger.warning(f"补偿文件中没有任何频率数据，使用原始值")
+            return value
+
+        x, y = table[direction]
+        result = self._interp(value, x, y, x_name, y_name)
+        if len(cache) >= _COMPENSATE_CACHE_SIZE:
+            cache.clear()
+        cache[key] = result
+        return result
+
+    def _get_freq_table(self, frequency: float) -> Optional[Dict]:
+        """获取指定频率的查表数据，频率不存在时使用最接近的频率；没有任何频率数据时返回None"""
+        # 频率未变化时直接复用上次选定的查表数据，跳过键查找和二分查找
+        cached = self._freq_table_cache
+        if cached is not None and cached[0] == frequency:
+            return cached[1]
+
+        table = self._tables.get(float(frequency))
+        if table is None:
+            # 尝试取整后的频率
+            table = self._tables.get(float(int(frequency)))
+            if table is None:
                 # 查找最接近的频率
-                available_freqs = [float(f) for f in json_data.keys()]
-                if not available_freqs:
-                    logger.warning(f"补偿文件中没有任何频率数据，使用原始值")
-                    return actual_attenuation
-                
-                closest_freq = min(available_freqs, key=lambda x: abs(x - self.current_frequency))
-                freq_str = str(closest_freq)
-                logger.warning(f"频率 {self.current_frequency} MHz 不在补偿数据中，使用最近频率 {closest_freq} MHz 的补偿数据")
-        
-        freq_data = json_data[freq_str]
-        
-        # 首先检查是否有精确匹配
-        for actual_str, display_val in freq_data.items():
-            if abs(float(actual_str) - actual_attenuation) < 0.01:  # 精确匹配（误差小于0.01dB）
-                logger.debug(f"精确匹配：实际设置值 {actual_attenuation} -> 显示值 {display_val}")
-                return display_val
-        
-        # 如果没有精确匹配，使用线性插值
-        actual_values = [float(k) for k in freq_data.keys()]
-        display_values = [float(v) for v in freq_data.values()]
-        
-        # 按实际值排序
-        sorted_pairs = sorted(zip(actual_values, display_values))
-        sorted_actual = [pair[0] for pair in sorted_pairs]
-        sorted_display = [pair[1] for pair in sorted_pairs]
-        
-        # 检查目标值是否在范围内
-        if actual_attenuation < min(sorted_actual):
-            logger.warning(f"实际设置值 {actual_attenuation} 小于最小值 {min(sorted_actual)}，使用最小值对应的显示值")
-            return sorted_display[0]
-        elif actual_attenuation > max(sorted_actual):
-            logger.warning(f"实际设置值 {actual_attenuation} 大于最大值 {max(sorted_actual)}，使用最大值对应的显示值")
-            return sorted_display[-1]
-        
+                if not self._tables:
+                    return None
+                closest_freq = self._find_closest_freq(frequency)
+                logger.warning(f"频率 {frequency} MHz 不在补偿数据中，使用最近频率 {closest_freq} MHz 的补偿数据")
+                table = self._tables[closest_freq]
+        self._freq_table_cache = (frequency, table)
+        return table
+
+    @classmethod
+    def _interp(cls, value: float, x: np.ndarray, y: np.ndarray, x_name: str, y_name: str) -> float:
+        """在按x排序的查表数组上由x查y：精确匹配直接返回，超出范围使用端点值，否则线性插值"""
+        # 首先检查是否有精确匹配（误差小于0.01dB），在排序数组上二分查找最近点
+        idx = cls._find_exact_index(x, value)
+        if idx is not None:
+            result = float(y[idx])
+            logger.debug("精确匹配：%s %s -> %s %s", x_name, value, y_name, result)
+            return result
+
+        # 如果没有精确匹配，使用线性插值；先检查输入值是否在范围内
+        if value < x[0]:
+            logger.warning(f"{x_name} {value} 小于最小值 {x[0]}，使用最小值对应的{y_name}")
+            return float(y[0])
+        elif value > x[-1]:
+            logger.warning(f"{x_name} {value} 大于最大值 {x[-1]}，使用最大值对应的{y_name}")
+            return float(y[-1])
+
         # 线性插值
-        import numpy as np
-        interpolated_display = np.interp(actual_attenuation, sorted_actual, sorted_display)
-        logger.debug(f"线性插值：实际设置值 {actual_attenuation} -> 显示值 {interpolated_display:.2f}")
-        return round(interpolated_display, 2)
+        result = np.interp(value, x, y)
+        logger.debug("线性插值：%s %s -> %s %.2f", x_name, value, y_name, result)
+        return float(round(result, 2))
 
     def set_frequency(self, frequency: float):
         """设置当前工作频率"""
+        if frequency != self.current_frequency:
+            self._clear_compensate_cache()
         self.current_frequency = frequency
         logger.info(f"设置工作频率为: {frequency} MHz")
 
@@ -289,21 +450,55 @@ class FrequencyCompensator:
         min_attenuation = abs(loss)
         return round(min_attenuation, 2)
 
-    def get_current_min_attenuation(self) -> float:
-        """获取当前频率下的最小衰减值"""
-        return self.get_min_attenuation_at_frequency(self.current_frequency)
+    def get_current_min_attenuation(self, frequency: Optional[float] = None) -> float:
+        """获取当前频率（或指定频率）下的最小衰减值（按频率缓存，补偿文件修改后失效）"""
+        if frequency is None:
+            frequency = self.current_frequency
+        self.check_and_reload_if_modified()
+        cache = self._min_att_cache
+        if self._min_att_cache_mtime != self.last_modified_time:
+            cache.clear()
+            self._min_att_cache_mtime = self.last_modified_time
+
+        min_attenuation = cache.get(frequency)
+        if min_attenuation is None:
+            min_attenuation = self.get_min_attenuation_at_frequency(frequency)
+            if len(cache) >= _MIN_ATT_CACHE_SIZE:
+                cache.clear()
+            cache[frequency] = min_attenuation
+        return min_attenuation
 
 
 class SerialAttenuator:
     """串口衰减器控制器"""
 
-    def __init__(self, port: str, baudrate: int = 9600):
+    def __init__(self, port: str, baudrate: int = 9600, timeout: float = 2.0, low_latency: bool = False):
         self.port = port
         self.baudrate = baudrate
+        self.timeout = timeout  # 等待设备响应的最长时间（秒）
+        self.low_latency = low_latency  # 打开串口后是否启用低延迟模式（USB转串口芯片默认16ms延迟定时器）
         self.serial_conn = None
         self.is_connected = False
         self.lock = threading.Lock()
         self.current_attenuation = 0.0  # 存储设备实际设置的衰减值（未补偿）
+        # 上次状态查询的补偿结果: ((实际值, 频率, 补偿文件签名), 显示值)
+        self._last_display_cache: Optional[Tuple[Tuple[float, float, Tuple[int, int]], float]] = None
+
+    def display_attenuation(self, compensator: FrequencyCompensator) -> Optional[float]:
+        """当前衰减值换算成的显示值；轮询时衰减值很少变化，实际值、频率和补偿文件均未变化时复用上次的结果"""
+        actual_value = self.current_attenuation
+        if actual_value is None:
+            return None
+
+        compensator.check_and_reload_if_modified()
+        cache_key = (actual_value, compensator.current_frequency, compensator.file_signature)
+        cached = self._last_display_cache
+        if cached is not None and cached[0] == cache_key:
+            return cached[1]
+
+        display_value = compensator.compensate_attenuation_for_reading(actual_value)
+        self._last_display_cache = (cache_key, display_value)
+        return display_value
 
     def connect(self) -> bool:
         """连接串口设备"""
@@ -314,11 +509,13 @@ class SerialAttenuator:
                 bytesize=serial.EIGHTBITS,
                 parity=serial.PARITY_NONE,
                 stopbits=serial.STOPBITS_ONE,
-                timeout=2.0
+                timeout=self.timeout
             )
 
             if self.serial_conn.is_open:
                 self.is_connected = True
+                if self.low_latency:
+                    self._enable_low_latency()
                 logger.info(f"成功连接到串口设备: {self.port}")
                 return True
             else:
@@ -329,32 +526,42 @@ class SerialAttenuator:
             logger.error(f"连接串口设备失败: {e}")
             return False
 
+    def _enable_low_latency(self):
+        """启用串口低延迟模式（仅Linux支持；驱动不支持时保持默认设置，不影响连接）"""
+        try:
+            self.serial_conn.set_low_latency_mode(True)
+            logger.info(f"串口 {self.port} 已启用低延迟模式")
+        except (AttributeError, NotImplementedError, OSError, ValueError) as e:
+            logger.warning(f"串口 {self.port} 不支持低延迟模式: {e}")
+
     def disconnect(self):
         """断开串口连接"""
-        if self.serial_conn and self.serial_conn.is_open:
-            self.serial_conn.close()
-            self.is_connected = False
-            logger.info(f"已断开串口连接: {self.port}")
+        # 与收发命令使用同一把锁，等待进行中的命令完成后再关闭串口
+        with self.lock:
+            if self.serial_conn and self.serial_conn.is_open:
+                self.serial_conn.close()
+                self.is_connected = False
+                logger.info(f"已断开串口连接: {self.port}")
 
     def send_command(self, command: str) -> str:
         """发送命令并接收响应"""
-        if not self.is_connected or not self.serial_conn:
-            raise Exception("串口未连接")
+        # 发送命令（添加回车换行符）
+        return self.send_bytes((command + '\r\n').encode('ascii'))
 
+    def send_bytes(self, cmd_bytes: bytes) -> str:
+        """发送已编码且带回车换行符的命令并接收响应"""
+        # 锁只保护单次write/read_until收发，连接状态在锁内检查，避免与disconnect竞争
         with self.lock:
+            if not self.is_connected or not self.serial_conn:
+                raise Exception("串口未连接")
+
             try:
-                # 发送命令（添加回车换行符）
-                cmd_bytes = (command + '\r\n').encode('ascii')
+                # 丢弃上一条命令残留的数据，避免读到过期响应
+                self.serial_conn.reset_input_buffer()
                 self.serial_conn.write(cmd_bytes)
 
-                # 等待设备处理
-                time.sleep(0.5)
-
-                # 读取响应
-                response = ""
-                while self.serial_conn.in_waiting > 0:
-                    response += self.serial_conn.read(self.serial_conn.in_waiting).decode('ascii', errors='ignore')
-                    time.sleep(0.1)
+                # 读取响应：收到行结束符立即返回，最长等待self.timeout秒
+                response = self.serial_conn.read_until(b'\r\n').decode('ascii', errors='ignore')
 
                 return response.strip()
 
@@ -365,13 +572,13 @@ class SerialAttenuator:
     def set_attenuation(self, value: float) -> bool:
         """设置衰减值"""
         try:
-            # 格式: att-xxx.xx
-            command = f"att-{value:06.2f}"
-            response = self.send_command(command)
+            # 格式: att-xxx.xx，直接格式化为带行结束符的字节串
+            response = self.send_bytes(_ATT_COMMAND % value)
 
             # 简化响应检查，只要没有异常就认为成功
             self.current_attenuation = value
-            logger.info(f"设置衰减值: {value}dB, 响应: {response}")
+            self._last_display_cache = None
+            logger.info("设置衰减值: %sdB, 响应: %s", value, response)
             return True
 
         except Exception as e:
@@ -401,17 +608,37 @@ class SerialAttenuator:
 class MultiAttenuatorController:
     """多衰减器控制器"""
 
-    def __init__(self, default_compensation_file: str = "1.json"):
+    def __init__(self, default_compensation_file: str = "1.json", low_latency: bool = False, timeout: float = 2.0):
         self.attenuators: Dict[str, SerialAttenuator] = {}
         self.compensators: Dict[str, FrequencyCompensator] = {}  # 每个设备对应一个补偿器
+        self._compensator_pool: Dict[str, FrequencyCompensator] = {}  # 补偿文件到补偿器实例的映射
         self.device_port_mapping: Dict[str, str] = {}  # 设备ID到端口的映射
         self.device_serial_mapping: Dict[str, str] = {}  # 设备ID到序列号的映射
         self.serial_to_compensation: Dict[str, str] = {}  # 序列号到补偿文件的映射
         self.default_compensation_file = default_compensation_file
+        self.low_latency = low_latency  # 新连接的串口是否启用低延迟模式
+        self.timeout = timeout  # 新连接的串口等待设备响应的最长时间（秒）
         self.available_ports = []
+        self.device_info: Dict[str, Dict] = {}  # 端口到设备信息（序列号等）的映射
+        self._device_info_time: Optional[float] = None  # 上次枚举串口的时间
         self.current_frequency = 1000.0  # 全局频率设置
+        # 状态版本号：频率、已连接设备或可用串口变化时递增，Web接口据此生成ETag
+        self.revision = 0
+        # 版本号锁：扫描、连接、断开和设置频率可能在不同线程中同时递增版本号
+        self._revision_lock = threading.Lock()
+        # 并发连接多个设备时保护设备表、补偿器池和设备信息的更新（打开串口本身不持锁）
+        self._connect_lock = threading.Lock()
+        # 频率锁：保护工作频率的修改和读取快照，设置/读取衰减值按快照频率补偿，串口IO期间不持锁
+        self._frequency_lock = threading.Lock()
+        # 长期复用的串口IO线程池，批量操作时各设备并发收发，避免每次调用重复创建线程
+        self._io_executor = ThreadPoolExecutor(max_workers=_IO_MAX_WORKERS, thread_name_prefix="attenuator-io")
         self._load_serial_mapping()
 
+    def _bump_revision(self):
+        """递增状态版本号（加锁，避免并发递增时丢失更新）"""
+        with self._revision_lock:
+            self.revision += 1
+
     def _load_serial_mapping(self):
         """加载设备序列号到补偿文件的映射配置"""
         try:
@@ -420,7 +647,7 @@ class MultiAttenuatorController:
             mapping_file = os.path.join(script_dir, "device_serial_mapping.json")
             if os.path.exists(mapping_file):
                 with open(mapping_file, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
+                    config = _json_loads(f.read())
                     self.serial_to_compensation = config.get("serial_to_compensation_mapping", {})
                     logger.info(f"加载设备序列号映射配置: {len(self.serial_to_compensation)} 个设备")
             else:
@@ -430,26 +657,37 @@ class MultiAttenuatorController:
             logger.error(f"加载序列号映射配置失败: {e}")
             self.serial_to_compensation = {}
 
-    def scan_serial_ports(self) -> List[str]:
-        """扫描可用的串口设备并获取序列号信息"""
+    def scan_serial_ports(self, max_age: float = 0.0) -> List[str]:
+        """扫描可用的串口设备并获取序列号信息
+
+        max_age > 0 时，若距上次成功扫描不超过max_age秒则直接返回上次的结果，不重新枚举串口
+        """
+        if max_age > 0 and self._device_info_time is not None \
+                and time.monotonic() - self._device_info_time <= max_age:
+            return self.available_ports
+
         ports = []
         device_info = {}
         try:
-            for port in serial.tools.list_ports.comports():
+            # 串口枚举模块仅在扫描时才需要，延迟导入以减少模块加载时间
+            from serial.tools import list_ports
+            for port in list_ports.comports():
+                # 记录所有串口的序列号信息，连接设备时无需重新枚举
+                serial_number = getattr(port, 'serial_number', None) or 'unknown'
+                device_info[port.device] = {
+                    'serial_number': serial_number,
+                    'description': getattr(port, 'description', ''),
+                    'manufacturer': getattr(port, 'manufacturer', '')
+                }
                 # 只添加ACM设备
-                if 'ACM' in port.device:
+                if port.device.startswith(_ACM_PORT_PREFIX):
                     ports.append(port.device)
-                    # 获取设备序列号
-                    serial_number = getattr(port, 'serial_number', None) or 'unknown'
-                    device_info[port.device] = {
-                        'serial_number': serial_number,
-                        'description': getattr(port, 'description', ''),
-                        'manufacturer': getattr(port, 'manufacturer', '')
-                    }
                     logger.info(f"发现设备: {port.device}, 序列号: {serial_number}")
 
             self.available_ports = ports
             self.device_info = device_info
+            self._bump_revision()
+            self._device_info_time = time.monotonic()
             logger.info(f"发现 {len(ports)} 个ACM串口设备: {ports}")
             return ports
 
@@ -463,28 +701,32 @@ class MultiAttenuatorController:
             device_id = f"att_{len(self.attenuators) + 1}"
 
         try:
-            # 判断是否为USB虚拟串口（STM32F4）
-            baudrate = 9600  # 默认TTL串口波特率
-            if "USB" in port.upper() or "ACM" in port.upper():
-                baudrate = 115200  # USB虚拟串口通常使用更高波特率
+            # USB虚拟串口（STM32F4）使用更高波特率，其余按TTL串口使用9600
+            baudrate = _baudrate_for_port(port)
 
-            attenuator = SerialAttenuator(port, baudrate)
+            attenuator = SerialAttenuator(port, baudrate, timeout=self.timeout, low_latency=self.low_latency)
 
             if attenuator.connect():
-                self.attenuators[device_id] = attenuator
-                self.device_port_mapping[device_id] = port
+                with self._connect_lock:
+                    self.attenuators[device_id] = attenuator
+                    self.device_port_mapping[device_id] = port
                 
-                # 获取设备序列号并记录映射关系
-                device_serial = self._get_device_serial(port)
-                self.device_serial_mapping[device_id] = device_serial
+                    # 获取设备序列号并记录映射关系
+                    device_serial = self._get_device_serial(port)
+                    self.device_serial_mapping[device_id] = device_serial
                 
-                # 为每个设备分配对应的补偿文件（优先使用序列号映射）
-                compensation_file = self._get_compensation_file_for_device(port, device_serial)
-                compensator = FrequencyCompensator(compensation_file)
-                compensator.set_frequency(self.current_frequency)
-                self.compensators[device_id] = compensator
+                    # 为每个设备分配对应的补偿文件（优先使用序列号映射）
+                    compensation_file = self._get_compensation_file_for_device(port, device_serial)
+                    # 使用相同补偿文件的设备共享同一个补偿器（频率为全局设置，各设备一致）
+                    compensator = self._compensator_pool.get(compensation_file)
+                    if compensator is None:
+                        compensator = FrequencyCompensator(compensation_file)
+                        self._compensator_pool[compensation_file] = compensator
+                    compensator.set_frequency(self.current_frequency)
+                    self.compensators[device_id] = compensator
+                    self._bump_revision()
                 
-                logger.info(f"成功连接衰减器 {device_id} 到端口 {port}，序列号: {device_serial}，使用补偿文件: {compensation_file}")
+                    logger.info(f"成功连接衰减器 {device_id} 到端口 {port}，序列号: {device_serial}，使用补偿文件: {compensation_file}")
                 return True
             else:
                 logger.error(f"连接衰减器失败: {port}")
@@ -494,17 +736,35 @@ class MultiAttenuatorController:
             logger.error(f"连接衰减器异常: {e}")
             return False
     
+    def order_devices(self, device_ids: List[str]):
+        """按给定的设备ID顺序重排已连接的设备（并行连接时设备按完成先后注册），未列出的设备排在最后"""
+        rank = {device_id: i for i, device_id in enumerate(device_ids)}
+
+        def _ordered(mapping: Dict) -> Dict:
+            return dict(sorted(mapping.items(), key=lambda item: rank.get(item[0], len(rank))))
+
+        with self._connect_lock:
+            self.attenuators = _ordered(self.attenuators)
+            self.compensators = _ordered(self.compensators)
+            self.device_port_mapping = _ordered(self.device_port_mapping)
+            self._bump_revision()
+
+    def _ensure_device_info(self):
+        """确保设备信息有效，距上次枚举超过_DEVICE_INFO_TTL秒时才重新扫描串口"""
+        self.scan_serial_ports(max_age=_DEVICE_INFO_TTL)
+
     def _get_device_serial(self, port: str) -> str:
         """获取指定端口设备的序列号"""
         try:
-            if hasattr(self, 'device_info') and port in self.device_info:
+            scanned_at = self._device_info_time
+            self._ensure_device_info()
+            if port not in self.device_info and self._device_info_time == scanned_at:
+                # 缓存的扫描结果中没有该端口（可能是刚插入的设备），立即重新扫描一次
+                self.scan_serial_ports()
+            if port in self.device_info:
                 return self.device_info[port]['serial_number']
-            else:
-                # 如果没有预先扫描的信息，尝试重新获取
-                for port_info in serial.tools.list_ports.comports():
-                    if port_info.device == port:
-                        return getattr(port_info, 'serial_number', None) or 'unknown'
-                return 'unknown'
+            logger.warning(f"未找到端口 {port} 的设备信息，序列号记为unknown")
+            return 'unknown'
         except Exception as e:
             logger.error(f"获取设备序列号失败: {e}")
             return 'unknown'
@@ -534,12 +794,10 @@ class MultiAttenuatorController:
     def _get_compensation_file_for_port(self, port: str) -> str:
         """根据COM口获取对应的补偿文件"""
         # 提取端口号，例如从 /dev/ttyACM0 提取 0，从 COM3 提取 3
-        import re
         
         # 匹配ACM端口号
-        acm_match = re.search(r'ACM(\d+)', port)
-        if acm_match:
-            port_num = int(acm_match.group(1))
+        port_num = _parse_port_number(port, 'ACM', _ACM_RE)
+        if port_num is not None:
             # acm0->1.json, acm1->2.json, acm2->3.json, acm3->4.json
             compensation_file = f"{port_num + 1}.json"
             script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -553,9 +811,8 @@ class MultiAttenuatorController:
                 return self.default_compensation_file
         
         # 匹配COM端口号
-        com_match = re.search(r'COM(\d+)', port, re.IGNORECASE)
-        if com_match:
-            port_num = int(com_match.group(1))
+        port_num = _parse_port_number(port, 'COM', _COM_RE)
+        if port_num is not None:
             compensation_file = f"{port_num}.json"
             script_dir = os.path.dirname(os.path.abspath(__file__))
             compensation_file_path = os.path.join(script_dir, "compensation_files", compensation_file)
@@ -571,17 +828,20 @@ class MultiAttenuatorController:
         return self.default_compensation_file
 
     def disconnect_all(self):
-        """断开所有衰减器连接"""
-        for device_id, attenuator in self.attenuators.items():
-            try:
-                attenuator.disconnect()
-                logger.info(f"断开衰减器 {device_id} 连接")
-            except Exception as e:
-                logger.error(f"断开衰减器 {device_id} 连接失败: {e}")
-        
-        self.attenuators.clear()
-        self.compensators.clear()
-        self.device_port_mapping.clear()
+        """断开所有衰减器连接（与连接设备互斥，避免遍历设备表时被并发修改）"""
+        with self._connect_lock:
+            for device_id, attenuator in self.attenuators.items():
+                try:
+                    attenuator.disconnect()
+                    logger.info(f"断开衰减器 {device_id} 连接")
+                except Exception as e:
+                    logger.error(f"断开衰减器 {device_id} 连接失败: {e}")
+            
+            self.attenuators.clear()
+            self.compensators.clear()
+            self._compensator_pool.clear()
+            self.device_port_mapping.clear()
+            self._bump_revision()
 
     def set_all_attenuation(self, target_value: float) -> Dict[str, bool]:
         """批量设置所有衰减器的衰减值，每个设备使用自己的补偿器"""
@@ -591,9 +851,23 @@ class MultiAttenuatorController:
             logger.warning("没有连接的衰减器")
             return results
         
-        logger.info(f"批量设置衰减值: 目标值={target_value}dB (频率={self.current_frequency}MHz)")
+        # 只在持有频率锁时取频率快照，整批的最小值检查和补偿计算都使用该频率，串口下发期间不持锁
+        with self._frequency_lock:
+            frequency = self.current_frequency
+            devices = list(self.attenuators.items())
+        logger.info("批量设置衰减值: 目标值=%sdB (频率=%sMHz)", target_value, frequency)
         
-        for device_id, attenuator in self.attenuators.items():
+        # 低于当前频率最小衰减值的请求直接拒绝，不下发任何串口命令
+        min_attenuation = self._max_min_attenuation(frequency)
+        if target_value < min_attenuation:
+            logger.warning(f"目标值 {target_value}dB 低于当前频率的最小衰减值 {min_attenuation}dB，拒绝设置")
+            return {device_id: False for device_id, _ in devices}
+        
+        # 使用相同补偿文件的设备共享同一个补偿计算结果
+        actual_values: Dict[str, float] = {}
+        plan: Dict[str, Tuple[SerialAttenuator, float]] = {}
+        
+        for device_id, attenuator in devices:
             try:
                 # 每个设备使用自己的补偿器
                 compensator = self.compensators.get(device_id)
@@ -602,31 +876,68 @@ class MultiAttenuatorController:
                     results[device_id] = False
                     continue
                 
-                # 使用设备专用的频率补偿计算实际衰减值
-                actual_value = compensator.compensate_attenuation(target_value)
+                # 使用设备专用的频率补偿计算实际衰减值（同组设备只计算一次）
+                group_key = compensator.compensation_file
+                actual_value = actual_values.get(group_key)
+                if actual_value is None:
+                    actual_value = compensator.compensate_attenuation(target_value, frequency=frequency)
+                    actual_values[group_key] = actual_value
+                plan[device_id] = (attenuator, actual_value)
                 
-                success = attenuator.set_attenuation(actual_value)
-                results[device_id] = success
-                
-                if success:
-                    logger.info(f"设备 {device_id} 设置成功: 目标值={target_value}dB, 实际值={actual_value}dB")
-                else:
-                    logger.error(f"设备 {device_id} 设置失败")
-                    
             except Exception as e:
                 logger.error(f"设备 {device_id} 设置异常: {e}")
                 results[device_id] = False
         
-        return results
+        # 每个设备使用独立的串口，并发下发设置命令
+        if plan:
+            futures = {
+                device_id: self._io_executor.submit(attenuator.set_attenuation, actual_value)
+                for device_id, (attenuator, actual_value) in plan.items()
+            }
+            
+            for device_id, future in futures.items():
+                actual_value = plan[device_id][1]
+                try:
+                    success = future.result()
+                    results[device_id] = success
+                    
+                    if success:
+                        logger.info("设备 %s 设置成功: 目标值=%sdB, 实际值=%sdB", device_id, target_value, actual_value)
+                    else:
+                        logger.error(f"设备 {device_id} 设置失败")
+                        
+                except Exception as e:
+                    logger.error(f"设备 {device_id} 设置异常: {e}")
+                    results[device_id] = False
+        
+        # 按设备连接顺序返回结果
+        return {device_id: results[device_id] for device_id, _ in devices}
 
     def get_all_attenuation(self) -> Dict[str, Optional[float]]:
         """获取所有衰减器的当前衰减值，每个设备使用自己的补偿器"""
         results = {}
 
-        for device_id, attenuator in self.attenuators.items():
+        if not self.attenuators:
+            return results
+
+        # 只在持有频率锁时取频率快照，所有设备的读数按同一频率换算，串口读取期间不持锁
+        with self._frequency_lock:
+            frequency = self.current_frequency
+            devices = list(self.attenuators.items())
+
+        # 每个设备使用独立的串口，并发读取实际设置的衰减值
+        futures = {
+            device_id: self._io_executor.submit(attenuator.read_attenuation)
+            for device_id, attenuator in devices
+        }
+
+        # 使用相同补偿文件且读数相同的设备共享同一个补偿计算结果
+        target_values: Dict[Tuple[str, float], float] = {}
+
+        for device_id, future in futures.items():
             try:
                 # 从设备读取实际设置的衰减值
-                actual_value = attenuator.read_attenuation()
+                actual_value = future.result()
                 if actual_value is not None:
                     # 每个设备使用自己的补偿器
                     compensator = self.compensators.get(device_id)
@@ -635,10 +946,14 @@ class MultiAttenuatorController:
                         results[device_id] = None
                         continue
                     
-                    # actual_value是设备实际设置的值（已补偿），需要转换回目标值
-                    target_value = compensator.compensate_attenuation_for_reading(actual_value)
+                    # actual_value是设备实际设置的值（已补偿），需要转换回目标值（同组设备只计算一次）
+                    group_key = (compensator.compensation_file, actual_value)
+                    target_value = target_values.get(group_key)
+                    if target_value is None:
+                        target_value = compensator.compensate_attenuation_for_reading(actual_value, frequency=frequency)
+                        target_values[group_key] = target_value
                     results[device_id] = target_value
-                    logger.info(f"设备 {device_id}: 实际值 {actual_value}dB -> 目标值 {target_value}dB")
+                    logger.info("设备 %s: 实际值 %sdB -> 目标值 %sdB", device_id, actual_value, target_value)
                 else:
                     results[device_id] = None
 
@@ -666,8 +981,12 @@ class MultiAttenuatorController:
             logger.error(f"设备 {device_id} 没有对应的补偿器")
             return False
 
+        # 取频率快照，最小值校验和补偿计算使用同一频率，串口下发期间不持频率锁
+        with self._frequency_lock:
+            frequency = self.current_frequency
+
         # 获取当前频率下的最小衰减值（用于校验）
-        min_attenuation = compensator.get_current_min_attenuation()
+        min_attenuation = compensator.get_current_min_attenuation(frequency)
 
         # 校验目标值是否在有效范围（用户输入的是未补偿值）
         if not (min_attenuation <= target_value <= 90.0):
@@ -679,13 +998,13 @@ class MultiAttenuatorController:
             attenuator = self.attenuators[device_id]
 
             # 计算补偿后的实际衰减值（关键逻辑）
-            actual_value = compensator.compensate_attenuation(target_value)
+            actual_value = compensator.compensate_attenuation(target_value, frequency=frequency)
 
             # 调用串口设备设置方法
             success = attenuator.set_attenuation(actual_value)
 
             if success:
-                logger.info(f"设备 {device_id} 设置成功：目标 {target_value}dB → 实际 {actual_value}dB")
+                logger.info("设备 %s 设置成功：目标 %sdB → 实际 %sdB", device_id, target_value, actual_value)
             else:
                 logger.error(f"设备 {device_id} 设置失败")
 
@@ -712,6 +1031,10 @@ class MultiAttenuatorController:
             logger.error(f"设备 {device_id} 没有对应的补偿器")
             return None
 
+        # 取频率快照，读数按读取开始时的频率换算，串口读取期间不持频率锁
+        with self._frequency_lock:
+            frequency = self.current_frequency
+
         try:
             attenuator = self.attenuators[device_id]
 
@@ -723,8 +1046,8 @@ class MultiAttenuatorController:
                 return None
 
             # 转换为用户可见的未补偿值（关键逻辑）
-            display_value = compensator.compensate_attenuation_for_reading(actual_value)
-            logger.info(f"设备 {device_id} 读取成功：实际 {actual_value}dB → 显示 {display_value}dB")
+            display_value = compensator.compensate_attenuation_for_reading(actual_value, frequency=frequency)
+            logger.info("设备 %s 读取成功：实际 %sdB → 显示 %sdB", device_id, actual_value, display_value)
 
             return display_value
 
@@ -733,13 +1056,15 @@ class MultiAttenuatorController:
             return None
 
     def set_frequency(self, frequency: float):
-        """设置工作频率，同步更新所有补偿器"""
-        self.current_frequency = frequency
-        
-        # 更新所有设备的补偿器频率
-        for device_id, compensator in self.compensators.items():
-            compensator.set_frequency(frequency)
-            logger.info(f"设备 {device_id} 补偿器频率已更新为: {frequency} MHz")
+        """设置工作频率，同步更新所有补偿器（进行中的设置/读取继续使用开始时的频率快照）"""
+        with self._frequency_lock:
+            self.current_frequency = frequency
+            self._bump_revision()
+            
+            # 更新所有设备的补偿器频率
+            for device_id, compensator in self.compensators.items():
+                compensator.set_frequency(frequency)
+                logger.info(f"设备 {device_id} 补偿器频率已更新为: {frequency} MHz")
         
         logger.info(f"全局工作频率设置为: {frequency} MHz")
 
@@ -756,18 +1081,17 @@ class MultiAttenuatorController:
         status = {}
 
         for device_id, attenuator in self.attenuators.items():
-            # 获取实际设置的衰减值
-            actual_value = attenuator.current_attenuation
-            # 转换为目标值（显示值）
-            display_value = None
-            if actual_value is not None:
-                # 获取设备专用的补偿器
-                if device_id in self.compensators:
-                    compensator = self.compensators[device_id]
-                    display_value = compensator.compensate_attenuation_for_reading(actual_value)
-                else:
-                    logger.error(f"设备 {device_id} 的补偿器不存在")
-                    display_value = actual_value  # 如果没有补偿器，直接使用实际值
+            # 将实际设置的衰减值转换为目标值（显示值）
+            compensator = self.compensators.get(device_id)
+            if compensator is None:
+                logger.error(f"设备 {device_id} 的补偿器不存在")
+                display_value = attenuator.current_attenuation  # 如果没有补偿器，直接使用实际值
+            else:
+                try:
+                    display_value = attenuator.display_attenuation(compensator)
+                except Exception as e:
+                    logger.error(f"设备 {device_id} 显示值换算失败: {e}")
+                    display_value = None
 
             status[device_id] = {
                 "port": attenuator.port,
@@ -777,14 +1101,20 @@ class MultiAttenuatorController:
 
         return status
 
+    def _max_min_attenuation(self, frequency: float) -> float:
+        """获取指定频率下所有设备最小衰减值中的最大值，确保所有设备都能正常工作"""
+        min_attenuations = [comp.get_current_min_attenuation(frequency) for comp in list(self.compensators.values())]
+        return max(min_attenuations) if min_attenuations else 0.0
+
     def get_min_attenuation(self) -> float:
         """获取当前频率下的最小衰减值（取所有设备中的最大值）"""
-        if not self.compensators:
-            return 0.0
-        
-        # 取所有设备补偿器中的最大最小衰减值，确保所有设备都能正常工作
-        min_attenuations = [comp.get_current_min_attenuation() for comp in self.compensators.values()]
-        return max(min_attenuations) if min_attenuations else 0.0
+        return self._max_min_attenuation(self.current_frequency)
+
+    def get_min_attenuation_and_frequency(self) -> Tuple[float, float]:
+        """同时获取当前频率下的最小衰减值和当前频率，保证两者对应同一频率"""
+        with self._frequency_lock:
+            frequency = self.current_frequency
+        return self._max_min_attenuation(frequency), frequency
 
     def get_min_attenuation_at_frequency(self, frequency: float) -> float:
         """获取指定频率下的最小衰减值（取所有设备中的最大值）"""
@@ -864,8 +1194,11 @@ class MultiAttenuatorController:
                 "note": "请将实际的设备序列号添加到此配置文件中"
             }
             
-            with open(mapping_file, 'w', encoding='utf-8') as f:
-                json.dump(config, f, indent=2, ensure_ascii=False)
+            # 一次性写入临时文件后原子替换，避免写入中断导致配置文件损坏
+            temp_file = mapping_file + '.tmp'
+            with open(temp_file, 'wb') as f:
+                f.write(_json_dumps_pretty(config))
+            os.replace(temp_file, mapping_file)
             
             logger.info(f"添加序列号映射: {serial_number} -> {compensation_file}")
             return True
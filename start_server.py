@@ -9,6 +9,7 @@ import sys
 import json
 import argparse
 import logging
+import importlib.util
 from pathlib import Path
 
 # 添加当前目录到Python路径
@@ -51,16 +52,14 @@ def check_dependencies():
         'fastapi',
         'uvicorn',
         'serial',
-        'pandas',
         'numpy'
     ]
     
     missing_packages = []
     
+    # 只查找包是否存在，不实际导入，避免启动时重复付出导入开销
     for package in required_packages:
-        try:
-            __import__(package)
-        except ImportError:
+        if importlib.util.find_spec(package) is None:
             missing_packages.append(package)
     
     if missing_packages:
@@ -131,8 +130,12 @@ def main():
             host=host,
             port=port,
             reload=reload,
+            # 模板关闭了auto_reload，开发模式下模板文件变化时同样重启服务
+            reload_includes=["*.html"] if reload else None,
             log_level="info" if debug else "warning",
-            access_log=debug
+            access_log=debug,
+            # uvicorn先等待所有连接关闭再执行lifespan关闭流程，SSE长连接需超时取消，才能断开设备
+            timeout_graceful_shutdown=server_config.get("graceful_shutdown_timeout", 3.0)
         )
         
     except KeyboardInterrupt:
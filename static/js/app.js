@@ -51,6 +51,9 @@ document.addEventListener('DOMContentLoaded', function() {
     // 初始化单设备控制功能
     loadDeviceList();
     
+    // 订阅服务器推送的状态变化
+    startStateEvents();
+    
     // 绑定单设备控制事件
     const deviceSelect = document.getElementById('device-select');
     const setSingleBtn = document.getElementById('set-single-attenuation-btn');
@@ -478,6 +481,38 @@ async function loadDeviceStatus() {
     }
 }
 
+// 订阅服务器推送的状态事件（SSE），状态变化时更新页面，替代定时轮询
+function startStateEvents() {
+    if (!window.EventSource) return;
+    
+    const source = new EventSource('/api/events');
+    source.onmessage = async (event) => {
+        const response = JSON.parse(event.data);
+        if (!response.success) return;
+        
+        const data = response.data;
+        const oldIds = connectedDevices.map(device => device.device_id).join(',');
+        connectedDevices = data.devices;
+        updateDevicesDisplay();
+        updateDeviceStatusTable();
+        if (systemStatus !== 'connecting') {
+            updateSystemStatus(connectedDevices.length > 0 ? 'connected' : 'disconnected');
+        }
+        
+        if (data.frequency !== currentFrequency) {
+            currentFrequency = data.frequency;
+            elements.frequencyInput.value = currentFrequency;
+            elements.currentFrequency.textContent = `${currentFrequency} MHz`;
+            await updateMinAttenuation();
+        }
+        
+        if (connectedDevices.map(device => device.device_id).join(',') !== oldIds) {
+            await loadDeviceList();
+        }
+    };
+    // 连接断开时EventSource会自动重连，重连后服务器会先推送一次完整状态
+}
+
 // 更新设备显示
 function updateDevicesDisplay() {
     if (connectedDevices.length === 0) {
@@ -758,9 +793,9 @@ function onDeviceSelectionChange() {
     }
 }
 
-// 定期刷新状态
+// 定期刷新状态（浏览器不支持SSE时的后备方案）
 setInterval(async () => {
-    if (systemStatus === 'connected') {
+    if (!window.EventSource && systemStatus === 'connected') {
         try {
             await loadDeviceStatus();
             await loadDeviceList(); // 定时更新设备列表
@@ -0,0 +1,24 @@
+"""
+Web API测试的公共断言辅助函数
+"""
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    import json
+    _json_loads = json.loads
+
+
+def assert_ok(response, **keys):
+    """断言响应为200且success为True，返回解析后的响应体
+
+    额外的关键字参数会逐一与响应体顶层字段比较
+    """
+    assert response.status_code == 200
+    data = _json_loads(response.content)
+    assert data['success'] is True
+    assert 'message' in data
+    for key, value in keys.items():
+        assert data[key] == value
+    return data
@@ -1,7 +1,5 @@
 import pytest
 import json
-import tempfile
-import os
 from unittest.mock import Mock, patch
 from serial_attenuator import FrequencyCompensator, SerialAttenuator, MultiAttenuatorController
 
@@ -19,17 +17,11 @@ def sample_frequency_data():
 
 
 @pytest.fixture
-def temp_json_file(sample_frequency_data):
-    """创建临时JSON文件用于测试"""
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
-        json.dump(sample_frequency_data, f)
-        temp_file = f.name
-    
-    yield temp_file
-    
-    # 清理临时文件
-    if os.path.exists(temp_file):
-        os.unlink(temp_file)
+def temp_json_file(tmp_path, sample_frequency_data):
+    """创建临时JSON文件用于测试，由pytest的tmp_path自动清理"""
+    temp_file = tmp_path / "frequency.json"
+    temp_file.write_text(json.dumps(sample_frequency_data), encoding='utf-8')
+    return str(temp_file)
 
 
 @pytest.fixture
@@ -42,6 +34,7 @@ def mock_serial():
     mock.write.return_value = None
     mock.read.return_value = b'OK\r\n'
     mock.readline.return_value = b'OK\r\n'
+    mock.read_until.return_value = b'OK\r\n'
     mock.close.return_value = None
     # 设置 in_waiting 为 PropertyMock，这样可以设置 side_effect
     from unittest.mock import PropertyMock
@@ -69,36 +62,77 @@ def mock_serial_attenuator(mock_serial):
 
 
 @pytest.fixture
-def sample_config():
-    """提供测试用的配置数据"""
-    return {
-        "frequency": {
-            "json_file": "1.json"
-        },
-        "serial": {
-            "baudrate": 9600,
-            "timeout": 1.0
-        }
-    }
+def mock_controller(temp_json_file):
+    """创建模拟的MultiAttenuatorController实例"""
+    with patch('serial.Serial'):
+        controller = MultiAttenuatorController(temp_json_file)
+        return controller
 
 
 @pytest.fixture
-def temp_config_file(sample_config):
-    """创建临时配置文件用于测试"""
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
-        json.dump(sample_config, f)
-        temp_file = f.name
-    
-    yield temp_file
-    
-    # 清理临时文件
-    if os.path.exists(temp_file):
-        os.unlink(temp_file)
+def connect_devices(mock_controller):
+    """返回连接模拟设备的辅助函数：参数为 {端口: 补偿文件}，第i个端口连接为device{i+1}，序列号为SN00{i+1}"""
+    def _connect(compensation_files):
+        for i, (port, compensation_file) in enumerate(compensation_files.items()):
+            mock_serial = Mock()
+            mock_serial.is_open = True
+            
+            with patch('serial.Serial', return_value=mock_serial), \
+                 patch.object(mock_controller, '_get_device_serial', return_value=f'SN00{i+1}'), \
+                 patch.object(mock_controller, '_get_compensation_file_for_device', return_value=compensation_file):
+                assert mock_controller.connect_attenuator(port, f'device{i+1}')
+        return mock_controller.attenuators
+    return _connect
+
+@pytest.fixture(scope="session")
+def client():
+    """创建整个测试会话共用的Web测试客户端"""
+    from fastapi.testclient import TestClient
+    from web_server import app
+    return TestClient(app)
+
+
+def _apply_web_controller_defaults(mock):
+    """设置Web测试用模拟控制器的默认返回值"""
+    mock.scan_serial_ports.return_value = ['COM1', 'COM2', 'COM3']
+    mock.connect_attenuator.return_value = True
+    mock.disconnect_attenuator.return_value = True
+    mock.disconnect_all.return_value = None
+    mock.get_connected_devices.return_value = ['COM1', 'COM2']
+    mock.set_frequency.return_value = None
+    mock.get_frequency.return_value = 2000
+    mock.set_all_attenuation.return_value = {'COM1': True, 'COM2': True}
+    mock.get_all_attenuation.return_value = {'COM1': 10.5, 'COM2': 15.0}
+    mock.set_attenuation_by_device_id.return_value = True
+    mock.get_attenuation_by_device_id.return_value = 12.5
+    mock.get_device_status.return_value = {'connected': True, 'port': 'COM1'}
+    mock.get_min_attenuation.return_value = {'COM1': 0.5, 'COM2': 1.0}
+    # 与真实控制器一致，组合最小衰减值和频率，测试中只需设置这两个方法的返回值
+    mock.get_min_attenuation_and_frequency.side_effect = lambda: (
+        mock.get_min_attenuation(), mock.get_frequency()
+    )
+    mock.revision = 0
+    mock.available_ports = ['COM1', 'COM2', 'COM3']
+    # 测试中可能直接替换该属性，每次恢复为新的Mock
+    mock.attenuators = Mock()
+
+
+@pytest.fixture(scope="session")
+def _web_controller_mock():
+    """整个测试会话共用的模拟控制器，通过依赖覆盖注入到所有API接口"""
+    from web_server import app, get_controller
+    mock = Mock()
+    app.dependency_overrides[get_controller] = lambda: mock
+    yield mock
+    app.dependency_overrides.pop(get_controller, None)
 
 
 @pytest.fixture
-def mock_controller(temp_json_file):
-    """创建模拟的MultiAttenuatorController实例"""
-    with patch('serial.Serial'):
-        controller = MultiAttenuatorController(temp_json_file)
-        return controller
\ No newline at end of file
+def mock_controller_for_web(_web_controller_mock):
+    """为Web测试提供模拟控制器，每个测试前重置调用记录和返回值"""
+    import web_server
+    _web_controller_mock.reset_mock(return_value=True, side_effect=True)
+    _apply_web_controller_defaults(_web_controller_mock)
+    # 共用的模拟控制器每个测试都从版本号0开始，清空按版本号缓存的状态响应
+    web_server._status_cache = None
+    return _web_controller_mock
@@ -2,6 +2,7 @@ import pytest
 import json
 import tempfile
 import os
+from unittest.mock import patch
 from serial_attenuator import FrequencyCompensator
 
 
@@ -30,13 +31,11 @@ class TestFrequencyCompensator:
         }
     
     @pytest.fixture
-    def temp_json_file(self, sample_frequency_data):
-        """创建临时JSON文件"""
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
-            json.dump(sample_frequency_data, f)
-            temp_file = f.name
-        yield temp_file
-        os.unlink(temp_file)
+    def temp_json_file(self, tmp_path, sample_frequency_data):
+        """创建临时JSON文件，由pytest的tmp_path自动清理"""
+        temp_file = tmp_path / "frequency.json"
+        temp_file.write_text(json.dumps(sample_frequency_data), encoding='utf-8')
+        return str(temp_file)
     
     @pytest.fixture
     def frequency_compensator(self, temp_json_file):
@@ -117,6 +116,15 @@ class TestFrequencyCompensator:
         # 负值应该使用最小值或进行外推
         assert isinstance(result, float)
     
+    @pytest.mark.parametrize("value", [float('nan'), float('inf'), float('-inf')])
+    def test_compensate_attenuation_rejects_non_finite(self, frequency_compensator, value):
+        """测试NaN/inf输入被直接拒绝"""
+        frequency_compensator.set_frequency(2000)
+        with pytest.raises(ValueError):
+            frequency_compensator.compensate_attenuation(value)
+        with pytest.raises(ValueError):
+            frequency_compensator.compensate_attenuation_for_reading(value)
+    
     def test_get_loss_at_frequency_exact(self, frequency_compensator):
         """测试获取精确频率的损耗值"""
         loss = frequency_compensator.get_loss_at_frequency(2000)
@@ -128,7 +136,15 @@ class TestFrequencyCompensator:
         loss = frequency_compensator.get_loss_at_frequency(2500)
         # get_loss_at_frequency返回的是插入损耗，进行插值计算
         assert isinstance(loss, float)
-    
+
+    def test_get_losses_at_frequencies(self, frequency_compensator):
+        """测试批量获取插入损耗与逐个查询结果一致"""
+        frequencies = [500, 1000, 2500, 10000]
+        losses = frequency_compensator.get_losses_at_frequencies(frequencies)
+        assert len(losses) == len(frequencies)
+        for frequency, loss in zip(frequencies, losses):
+            assert loss == frequency_compensator.get_loss_at_frequency(frequency)
+
     def test_empty_frequency_data(self):
         """测试空频率数据的处理"""
         with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as temp_file:
@@ -164,4 +180,144 @@ class TestFrequencyCompensator:
             assert isinstance(result1, (int, float))
             assert isinstance(result2, (int, float))
         finally:
-            os.unlink(temp_filename)
\ No newline at end of file
+            os.unlink(temp_filename)
+    
+    def test_json_data_cached_until_file_modified(self, frequency_compensator, temp_json_file):
+        """测试补偿文件解析结果被缓存，文件修改后重新加载"""
+        frequency_compensator.set_frequency(1000)
+        with patch('builtins.open', wraps=open) as mock_file:
+            frequency_compensator.compensate_attenuation(10.5)
+            frequency_compensator.compensate_attenuation_for_reading(10.0)
+            assert mock_file.call_count == 0
+        
+        # 修改文件内容并更新修改时间
+        with open(temp_json_file, 'w') as f:
+            json.dump({"1000.0": {"0.0": 2.0, "10.0": 12.0, "20.0": 22.0}}, f)
+        mtime = os.path.getmtime(temp_json_file) + 10
+        os.utime(temp_json_file, (mtime, mtime))
+        frequency_compensator._last_stat_check = 0.0
+        
+        assert frequency_compensator.compensate_attenuation(12.0) == 10.0
+    
+    def test_corrupted_file_drops_tables_and_retries(self, tmp_path):
+        """测试补偿文件损坏后不再沿用旧的查表数据，文件修复后即使修改时间相同也会重新加载"""
+        path = tmp_path / "comp.json"
+        good = json.dumps({"1000.0": {"0.0": 2.0, "10.0": 12.0, "20.0": 22.0}})
+        path.write_text(good)
+        compensator = FrequencyCompensator(str(path))
+        assert compensator.compensate_attenuation(12.0) == 10.0
+        
+        path.write_text("{invalid json")
+        mtime_ns = os.stat(path).st_mtime_ns + 10**9
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+        compensator._last_stat_check = 0.0
+        with pytest.raises(RuntimeError):
+            compensator.compensate_attenuation(12.0)
+        
+        # 写回正确内容并恢复为损坏时的修改时间，仍会在下一次检查时重新加载
+        path.write_text(good)
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+        compensator._last_stat_check = 0.0
+        assert compensator.compensate_attenuation(12.0) == 10.0
+    
+    def test_compensate_does_not_stat_every_call(self, frequency_compensator):
+        """测试补偿查表与插入损耗查询共用节流的文件检查，检查间隔内不重复访问文件系统"""
+        frequency_compensator._last_stat_check = 0.0
+        with patch('os.stat', wraps=os.stat) as mock_stat:
+            for value in (10.5, 15.5, 20.5):
+                frequency_compensator.compensate_attenuation(value)
+                frequency_compensator.compensate_attenuation_for_reading(value)
+            assert mock_stat.call_count == 1
+    
+    def test_parsed_file_shared_between_instances(self, frequency_compensator, temp_json_file):
+        """测试同一补偿文件的解析结果在多个实例间共享，不重复读取文件"""
+        with patch('builtins.open', wraps=open) as mock_file:
+            other = FrequencyCompensator(temp_json_file)
+            assert mock_file.call_count == 0
+        
+        other.set_frequency(2000)
+        frequency_compensator.set_frequency(2000)
+        assert other.compensate_attenuation(15.5) == frequency_compensator.compensate_attenuation(15.5)
+    
+    def test_compensate_attenuation_cached_per_frequency(self, frequency_compensator):
+        """测试补偿结果按(频率, 目标值)缓存，切换频率后失效"""
+        frequency_compensator.set_frequency(1000)
+        first = frequency_compensator.compensate_attenuation(15.5)
+        with patch.object(frequency_compensator, '_interp') as mock_lookup:
+            assert frequency_compensator.compensate_attenuation(15.5) == first
+            mock_lookup.assert_not_called()
+        
+        frequency_compensator.set_frequency(2000)
+        assert frequency_compensator.compensate_attenuation(15.5) == 14.5
+    
+    def test_compensate_attenuation_closest_integer_key(self):
+        """测试最接近的频率键为整数格式时也能正确查表"""
+        data = {"30": {"0.0": 3.0, "10.0": 13.0}, "130.0": {"0.0": 4.0, "10.0": 14.0}}
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as temp_file:
+            json.dump(data, temp_file)
+            temp_filename = temp_file.name
+        
+        try:
+            compensator = FrequencyCompensator(temp_filename)
+            compensator.set_frequency(50)
+            assert compensator.compensate_attenuation(8.0) == 5.0
+            compensator.set_frequency(100)
+            assert compensator.compensate_attenuation_for_reading(5.0) == 9.0
+        finally:
+            os.unlink(temp_filename)
+    
+    def test_freq_table_selected_once_per_frequency(self, frequency_compensator):
+        """测试同一频率下多次查表只查找一次最接近的频率，切换频率后重新查找"""
+        frequency_compensator.set_frequency(1400)
+        with patch.object(frequency_compensator, '_find_closest_freq', wraps=frequency_compensator._find_closest_freq) as mock_find:
+            frequency_compensator.compensate_attenuation(5.0)
+            frequency_compensator.compensate_attenuation(15.0)
+            frequency_compensator.compensate_attenuation_for_reading(12.0)
+            assert mock_find.call_count == 1
+            
+            frequency_compensator.set_frequency(2600)
+            assert frequency_compensator.compensate_attenuation(11.5) == 10.0
+            assert mock_find.call_count == 2
+    
+    def test_current_min_attenuation_cached(self, frequency_compensator):
+        """测试当前频率的最小衰减值被缓存，切换频率后重新计算"""
+        frequency_compensator.set_frequency(1000)
+        assert frequency_compensator.get_current_min_attenuation() == 0.5
+        with patch.object(frequency_compensator, 'get_min_attenuation_at_frequency') as mock_min:
+            assert frequency_compensator.get_current_min_attenuation() == 0.5
+            mock_min.assert_not_called()
+        
+        frequency_compensator.set_frequency(3000)
+        assert frequency_compensator.get_current_min_attenuation() == 1.5
+    
+    def test_min_attenuation_cached_per_frequency(self, frequency_compensator):
+        """测试在多个频率间切换时各频率的最小衰减值都只计算一次"""
+        for freq in (1000, 3000):
+            frequency_compensator.set_frequency(freq)
+            frequency_compensator.get_current_min_attenuation()
+        
+        with patch.object(frequency_compensator, 'get_min_attenuation_at_frequency') as mock_min:
+            frequency_compensator.set_frequency(1000)
+            assert frequency_compensator.get_current_min_attenuation() == 0.5
+            frequency_compensator.set_frequency(3000)
+            assert frequency_compensator.get_current_min_attenuation() == 1.5
+            mock_min.assert_not_called()
+    
+    def test_loss_at_current_frequency_cached(self, frequency_compensator):
+        """测试当前工作频率的插入损耗被缓存，其他频率仍实时插值"""
+        frequency_compensator.set_frequency(1000)
+        loss = frequency_compensator.get_loss_at_frequency(1000)
+        with patch('serial_attenuator.np.interp') as mock_interp:
+            assert frequency_compensator.get_loss_at_frequency(1000) == loss
+            mock_interp.assert_not_called()
+        
+        assert frequency_compensator.get_loss_at_frequency(3000) != loss
+    
+    def test_check_and_reload_throttled(self, frequency_compensator):
+        """测试短时间内多次检查文件修改只访问一次文件系统"""
+        frequency_compensator._last_stat_check = 0.0
+        with patch('os.stat', wraps=os.stat) as mock_stat:
+            frequency_compensator.check_and_reload_if_modified()
+            frequency_compensator.check_and_reload_if_modified()
+            frequency_compensator.get_loss_at_frequency(1500)
+            assert mock_stat.call_count == 1
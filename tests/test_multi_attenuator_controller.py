@@ -2,6 +2,7 @@ import pytest
 import json
 import tempfile
 import os
+import threading
 from unittest.mock import Mock, patch, MagicMock, mock_open
 from serial_attenuator import MultiAttenuatorController, SerialAttenuator
 import serial
@@ -26,7 +27,7 @@ class TestMultiAttenuatorController:
     
     def test_scan_serial_ports(self, mock_controller):
         """测试扫描串口"""
-        mock_ports = [Mock(), Mock(), Mock()]
+        mock_ports = [Mock(), Mock(), Mock(), Mock()]
         mock_ports[0].device = '/dev/ttyACM0'
         mock_ports[0].serial_number = 'SN001'
         mock_ports[0].description = 'ACM Device 1'
@@ -41,6 +42,10 @@ class TestMultiAttenuatorController:
         mock_ports[2].device = '/dev/ttyUSB0'
         mock_ports[2].serial_number = 'SN003'
         
+        # 名称中包含ACM但不是/dev/ttyACM设备节点，也应该被过滤掉
+        mock_ports[3].device = '/dev/serial/by-id/usb-STM_ACM-if00'
+        mock_ports[3].serial_number = 'SN004'
+        
         with patch('serial.tools.list_ports.comports', return_value=mock_ports):
             ports = mock_controller.scan_serial_ports()
             
@@ -48,9 +53,57 @@ class TestMultiAttenuatorController:
             assert '/dev/ttyACM0' in ports
             assert '/dev/ttyACM1' in ports
             assert '/dev/ttyUSB0' not in ports
+            assert '/dev/serial/by-id/usb-STM_ACM-if00' not in ports
             assert hasattr(mock_controller, 'device_info')
             assert '/dev/ttyACM0' in mock_controller.device_info
-    
+
+    def test_scan_serial_ports_max_age(self, mock_controller):
+        """测试max_age内重复扫描直接返回上次结果，默认参数总是重新枚举"""
+        mock_port = Mock()
+        mock_port.device = '/dev/ttyACM0'
+        mock_port.serial_number = 'SN001'
+
+        with patch('serial.tools.list_ports.comports', return_value=[mock_port]) as mock_comports:
+            assert mock_controller.scan_serial_ports(max_age=1.0) == ['/dev/ttyACM0']
+            assert mock_controller.scan_serial_ports(max_age=1.0) == ['/dev/ttyACM0']
+            assert mock_comports.call_count == 1
+
+            mock_controller.scan_serial_ports()
+            assert mock_comports.call_count == 2
+
+    def test_get_device_serial_uses_cached_scan(self, mock_controller):
+        """测试有效期内获取序列号不重复枚举串口"""
+        mock_port = Mock()
+        mock_port.device = '/dev/ttyACM0'
+        mock_port.serial_number = 'SN001'
+
+        with patch('serial.tools.list_ports.comports', return_value=[mock_port]) as mock_comports:
+            assert mock_controller._get_device_serial('/dev/ttyACM0') == 'SN001'
+            assert mock_controller._get_device_serial('/dev/ttyACM0') == 'SN001'
+            assert mock_comports.call_count == 1
+
+            # 超过有效期后重新枚举
+            mock_controller._device_info_time -= 10
+            mock_controller._get_device_serial('/dev/ttyACM0')
+            assert mock_comports.call_count == 2
+
+    def test_get_device_serial_rescans_for_new_port(self, mock_controller):
+        """测试缓存的扫描结果中没有该端口时立即重新扫描一次，识别刚插入的设备"""
+        old_port = Mock(device='/dev/ttyACM0', serial_number='SN001')
+        new_port = Mock(device='/dev/ttyACM1', serial_number='SN002')
+
+        with patch('serial.tools.list_ports.comports', return_value=[old_port]) as mock_comports:
+            mock_controller.scan_serial_ports()
+            mock_comports.return_value = [old_port, new_port]
+            assert mock_controller._get_device_serial('/dev/ttyACM1') == 'SN002'
+            assert mock_comports.call_count == 2
+
+            # 重新扫描后仍不存在的端口只扫描一次
+            mock_comports.return_value = [old_port]
+            mock_controller._device_info_time -= 10
+            assert mock_controller._get_device_serial('/dev/ttyACM9') == 'unknown'
+            assert mock_comports.call_count == 3
+
     def test_connect_attenuator_success(self, mock_controller):
         """测试成功连接衰减器"""
         mock_serial = Mock()
@@ -91,6 +144,81 @@ class TestMultiAttenuatorController:
             
             assert result is True  # 应该返回成功，因为可以重新连接
     
+    def test_connect_attenuator_uses_configured_timeout(self, temp_json_file):
+        """测试控制器配置的响应超时传递给新连接的串口"""
+        controller = MultiAttenuatorController(temp_json_file, timeout=3.5)
+        
+        with patch('serial.Serial', return_value=Mock(is_open=True)) as mock_serial_class, \
+             patch.object(controller, '_get_device_serial', return_value='SN001'):
+            assert controller.connect_attenuator('COM1', 'device1')
+        
+        assert controller.attenuators['device1'].timeout == 3.5
+        assert mock_serial_class.call_args.kwargs['timeout'] == 3.5
+    
+    def test_connect_attenuator_baudrate_by_port(self, mock_controller):
+        """测试USB虚拟串口使用115200波特率，其他串口使用9600"""
+        mock_serial = Mock()
+        mock_serial.is_open = True
+        
+        with patch('serial.Serial', return_value=mock_serial), \
+             patch.object(mock_controller, '_get_device_serial', return_value='SN001'):
+            mock_controller.connect_attenuator('/dev/ttyACM0', 'device1')
+            mock_controller.connect_attenuator('/dev/ttyUSB1', 'device2')
+            mock_controller.connect_attenuator('COM3', 'device3')
+            # 名称中仅包含usb字样、不是USB虚拟串口设备节点的端口不升级波特率
+            mock_controller.connect_attenuator('/dev/ttyusb1', 'device4')
+        
+        assert mock_controller.attenuators['device1'].baudrate == 115200
+        assert mock_controller.attenuators['device2'].baudrate == 115200
+        assert mock_controller.attenuators['device3'].baudrate == 9600
+        assert mock_controller.attenuators['device4'].baudrate == 9600
+    
+    def test_order_devices(self, mock_controller, connect_devices):
+        """测试按请求顺序重排并行连接后按完成先后注册的设备"""
+        connect_devices({'COM1': '1.json', 'COM2': '1.json', 'COM3': '1.json'})
+        revision = mock_controller.revision
+        
+        mock_controller.order_devices(['device3', 'device1'])
+        
+        assert list(mock_controller.attenuators) == ['device3', 'device1', 'device2']
+        assert list(mock_controller.compensators) == ['device3', 'device1', 'device2']
+        assert list(mock_controller.device_port_mapping) == ['device3', 'device1', 'device2']
+        assert mock_controller.revision == revision + 1
+    
+    def test_get_compensation_file_for_port(self, mock_controller):
+        """测试根据端口号选择补偿文件"""
+        assert mock_controller._get_compensation_file_for_port('/dev/ttyACM0') == '1.json'
+        assert mock_controller._get_compensation_file_for_port('/dev/ttyACM3') == '4.json'
+        assert mock_controller._get_compensation_file_for_port('COM3') == '3.json'
+        assert mock_controller._get_compensation_file_for_port('com2') == '2.json'
+        assert mock_controller._get_compensation_file_for_port('/dev/ttyUSB0') == mock_controller.default_compensation_file
+    
+    def test_devices_share_compensator_per_file(self, mock_controller, connect_devices):
+        """测试使用相同补偿文件的设备共享同一个补偿器实例"""
+        connect_devices({'COM1': '1.json', 'COM2': '1.json', 'COM3': '2.json'})
+        
+        compensators = mock_controller.compensators
+        assert compensators['device1'] is compensators['device2']
+        assert compensators['device1'] is not compensators['device3']
+    
+    def test_concurrent_connect_shares_compensator(self, mock_controller):
+        """测试多个线程并发连接时使用相同补偿文件的设备仍共享同一个补偿器"""
+        ports = ['COM1', 'COM2', 'COM3', 'COM4']
+        with patch('serial.Serial', side_effect=lambda **kwargs: Mock(is_open=True)), \
+             patch.object(mock_controller, '_get_device_serial', return_value='SN001'), \
+             patch.object(mock_controller, '_get_compensation_file_for_device', return_value='1.json'):
+            threads = [
+                threading.Thread(target=mock_controller.connect_attenuator, args=(port, f'device{i+1}'))
+                for i, port in enumerate(ports)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(timeout=2)
+        
+        assert len(mock_controller.attenuators) == len(ports)
+        assert len({id(comp) for comp in mock_controller.compensators.values()}) == 1
+    
     def test_disconnect_all_success(self, mock_controller):
         """测试成功断开所有衰减器连接"""
         # 先连接多个设备
@@ -193,12 +321,137 @@ class TestMultiAttenuatorController:
         assert len(results) == 2
         assert all(results.values())  # 所有设备都应该返回True
     
+    def test_set_all_attenuation_shared_compensation(self, mock_controller, connect_devices):
+        """测试使用相同补偿文件的设备只计算一次补偿值"""
+        connect_devices({'COM1': '1.json', 'COM2': '1.json'})
+        
+        for device_id in mock_controller.attenuators:
+            mock_controller.attenuators[device_id].set_attenuation = Mock(return_value=True)
+        
+        with patch('serial_attenuator.FrequencyCompensator.compensate_attenuation', return_value=12.0) as mock_compensate:
+            results = mock_controller.set_all_attenuation(15.0)
+        
+        assert results == {'device1': True, 'device2': True}
+        mock_compensate.assert_called_once_with(15.0, frequency=1000.0)
+        for attenuator in mock_controller.attenuators.values():
+            attenuator.set_attenuation.assert_called_once_with(12.0)
+    
+    def test_set_all_attenuation_concurrent(self, mock_controller, connect_devices):
+        """测试批量设置时各设备的串口命令并发下发"""
+        connect_devices({'COM1': '1.json', 'COM2': '1.json'})
+        
+        # 两个设备必须同时处于set_attenuation中才能通过屏障
+        barrier = threading.Barrier(2, timeout=2)
+        
+        def wait_for_peer(value):
+            barrier.wait()
+            return True
+        
+        for attenuator in mock_controller.attenuators.values():
+            attenuator.set_attenuation = Mock(side_effect=wait_for_peer)
+        
+        results = mock_controller.set_all_attenuation(15.0)
+        
+        assert results == {'device1': True, 'device2': True}
+    
+    def test_set_frequency_not_blocked_by_batch_set(self, mock_controller, connect_devices):
+        """测试批量设置下发期间切换频率不必等待慢设备，同一批设备使用开始时频率的补偿值"""
+        connect_devices({'COM1': '1.json', 'COM2': '1.json'})
+        expected = mock_controller.compensators['device1'].compensate_attenuation(30.0, frequency=1000.0)
+        writing = threading.Event()
+        release = threading.Event()
+        
+        def slow_set(value):
+            writing.set()
+            release.wait(timeout=2)
+            return True
+        
+        for attenuator in mock_controller.attenuators.values():
+            attenuator.set_attenuation = Mock(side_effect=slow_set)
+        
+        setter = threading.Thread(target=mock_controller.set_all_attenuation, args=(30.0,))
+        setter.start()
+        try:
+            assert writing.wait(timeout=2)
+            
+            changer = threading.Thread(target=mock_controller.set_frequency, args=(3000.0,))
+            changer.start()
+            changer.join(timeout=1)
+            assert not changer.is_alive()
+            assert mock_controller.get_frequency() == 3000.0
+        finally:
+            release.set()
+            setter.join(timeout=2)
+        
+        for attenuator in mock_controller.attenuators.values():
+            attenuator.set_attenuation.assert_called_once_with(expected)
+    
+    def test_get_attenuation_by_device_id_uses_frequency_snapshot(self, mock_controller, connect_devices):
+        """测试单设备读取期间切换频率时，读数仍按读取开始时的频率换算"""
+        connect_devices({'COM1': '1.json'})
+        compensator = mock_controller.compensators['device1']
+        expected = compensator.compensate_attenuation_for_reading(30.0, frequency=1000.0)
+        
+        def read_while_changing():
+            mock_controller.set_frequency(3000.0)
+            return 30.0
+        
+        mock_controller.attenuators['device1'].read_attenuation = Mock(side_effect=read_while_changing)
+        
+        assert mock_controller.get_attenuation_by_device_id('device1') == expected
+        assert mock_controller.get_frequency() == 3000.0
+    
+    @pytest.mark.parametrize("content", [None, "{invalid json"], ids=['missing_file', 'bad_json'])
+    def test_set_all_attenuation_unloadable_compensation_file(self, mock_controller, connect_devices, tmp_path, content):
+        """测试补偿文件缺失或无法解析的设备设置失败，不下发未补偿的原始值"""
+        bad_file = tmp_path / "bad.json"
+        if content is not None:
+            bad_file.write_text(content)
+        connect_devices({'COM1': '1.json', 'COM2': str(bad_file)})
+        
+        for attenuator in mock_controller.attenuators.values():
+            attenuator.set_attenuation = Mock(return_value=True)
+        
+        results = mock_controller.set_all_attenuation(30.0)
+        
+        assert results == {'device1': True, 'device2': False}
+        mock_controller.attenuators['device2'].set_attenuation.assert_not_called()
+    
+    def test_set_all_attenuation_below_minimum_skips_io(self, mock_controller):
+        """测试目标值低于最小衰减值时直接拒绝，不下发串口命令"""
+        mock_serial = Mock()
+        mock_serial.is_open = True
+        
+        with patch('serial.Serial', return_value=mock_serial):
+            mock_controller.connect_attenuator('COM1', 'device1')
+        
+        mock_controller.attenuators['device1'].set_attenuation = Mock(return_value=True)
+        
+        with patch.object(mock_controller, 'get_min_attenuation', return_value=5.0):
+            results = mock_controller.set_all_attenuation(3.0)
+        
+        assert results == {'device1': False}
+        mock_controller.attenuators['device1'].set_attenuation.assert_not_called()
+    
     def test_set_all_attenuation_no_devices(self, mock_controller):
         """测试在没有连接设备时设置衰减值"""
         results = mock_controller.set_all_attenuation(10.0)
         
         assert len(results) == 0
     
+    def test_get_all_attenuation_shared_compensation(self, mock_controller, connect_devices):
+        """测试使用相同补偿文件且读数相同的设备只计算一次显示值"""
+        connect_devices({'COM1': '1.json', 'COM2': '1.json'})
+        
+        for device_id in mock_controller.attenuators:
+            mock_controller.attenuators[device_id].read_attenuation = Mock(return_value=10.0)
+        
+        with patch('serial_attenuator.FrequencyCompensator.compensate_attenuation_for_reading', return_value=10.5) as mock_compensate:
+            results = mock_controller.get_all_attenuation()
+        
+        assert results == {'device1': 10.5, 'device2': 10.5}
+        mock_compensate.assert_called_once_with(10.0, frequency=1000.0)
+    
     def test_get_all_attenuation_success(self, mock_controller):
         """测试成功获取所有设备的衰减值"""
         # 连接设备并模拟响应
@@ -300,7 +553,31 @@ class TestMultiAttenuatorController:
         assert 'device1' in status
         assert status['device1']['connected'] is True
         assert status['device1']['port'] == 'COM1'
-    
+
+    def test_get_device_status_reuses_display_value(self, mock_controller):
+        """测试衰减值未变化时复用上次的显示值，设置新衰减值后重新计算"""
+        mock_serial = Mock()
+        mock_serial.is_open = True
+
+        with patch('serial.Serial', return_value=mock_serial):
+            mock_controller.connect_attenuator('COM1', 'device1')
+
+        compensator = mock_controller.compensators['device1']
+        with patch.object(compensator, 'compensate_attenuation_for_reading', return_value=10.5) as mock_comp:
+            first = mock_controller.get_device_status()
+            second = mock_controller.get_device_status()
+            assert mock_comp.call_count == 1
+            assert first == second
+
+            mock_controller.attenuators['device1'].set_attenuation(12.0)
+            mock_controller.get_device_status()
+            assert mock_comp.call_count == 2
+
+            # 频率变化后也需要重新计算
+            mock_controller.set_frequency(2500)
+            mock_controller.get_device_status()
+            assert mock_comp.call_count == 3
+
     def test_get_device_status_no_devices(self, mock_controller):
         """测试获取设备状态时没有连接设备"""
         status = mock_controller.get_device_status()
@@ -322,6 +599,67 @@ class TestMultiAttenuatorController:
         
         assert result == 1.0
     
+    def test_revision_changes_with_state(self, mock_controller):
+        """测试频率设置和设备连接/断开都会递增状态版本号"""
+        revision = mock_controller.revision
+        mock_controller.set_frequency(2500)
+        assert mock_controller.revision > revision
+        
+        revision = mock_controller.revision
+        with patch('serial.Serial', return_value=Mock(is_open=True)):
+            mock_controller.connect_attenuator('COM1', 'device1')
+        assert mock_controller.revision > revision
+        
+        revision = mock_controller.revision
+        mock_controller.disconnect_all()
+        assert mock_controller.revision > revision
+
+    def test_revision_bumps_not_lost_across_threads(self, mock_controller):
+        """测试多个线程同时递增版本号时不会丢失更新"""
+        revision = mock_controller.revision
+
+        def bump():
+            for _ in range(1000):
+                mock_controller._bump_revision()
+
+        threads = [threading.Thread(target=bump) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+
+        assert mock_controller.revision == revision + 4000
+
+    def test_disconnect_all_waits_for_connect(self, mock_controller, connect_devices):
+        """测试断开所有设备会等待进行中的连接完成，不会在遍历设备表时被并发修改"""
+        connect_devices({'COM1': '1.json'})
+
+        with mock_controller._connect_lock:
+            disconnector = threading.Thread(target=mock_controller.disconnect_all)
+            disconnector.start()
+            disconnector.join(timeout=0.1)
+            assert disconnector.is_alive()
+            assert 'device1' in mock_controller.attenuators
+
+        disconnector.join(timeout=2)
+        assert mock_controller.attenuators == {}
+
+    def test_get_min_attenuation_and_frequency(self, mock_controller):
+        """测试一次调用同时获取最小衰减值和当前频率"""
+        assert mock_controller.get_min_attenuation_and_frequency() == (0.0, mock_controller.current_frequency)
+        
+        mock_serial = Mock()
+        mock_serial.is_open = True
+        
+        with patch('serial.Serial', return_value=mock_serial):
+            mock_controller.connect_attenuator('COM1', 'device1')
+        mock_controller.set_frequency(2500)
+        
+        with patch.object(mock_controller.compensators['device1'], 'get_current_min_attenuation', return_value=1.2):
+            result = mock_controller.get_min_attenuation_and_frequency()
+        
+        assert result == (1.2, 2500)
+    
     def test_get_min_attenuation_at_frequency_success(self, mock_controller):
         """测试成功获取指定频率下的最小衰减值"""
         mock_serial = Mock()
@@ -354,6 +692,18 @@ class TestMultiAttenuatorController:
         
         assert mock_controller.serial_to_compensation == mapping_data["serial_to_compensation_mapping"]
     
+    def test_add_serial_mapping_writes_file(self, mock_controller, tmp_path):
+        """测试添加序列号映射后配置文件被完整写入且不残留临时文件"""
+        fake_module = str(tmp_path / 'serial_attenuator.py')
+        with patch('os.path.abspath', return_value=fake_module):
+            assert mock_controller.add_serial_mapping('SN001', 'device1.json') is True
+
+        mapping_file = tmp_path / 'device_serial_mapping.json'
+        with open(mapping_file, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        assert config['serial_to_compensation_mapping']['SN001'] == 'device1.json'
+        assert not (tmp_path / 'device_serial_mapping.json.tmp').exists()
+
     def test_load_serial_mapping_file_not_exists(self, mock_controller):
         """测试加载不存在的序列号映射文件"""
         with patch('os.path.exists', return_value=False):
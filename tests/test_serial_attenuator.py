@@ -1,4 +1,5 @@
 import pytest
+import threading
 from unittest.mock import Mock, patch, MagicMock, PropertyMock
 from serial_attenuator import SerialAttenuator, FrequencyCompensator
 import serial
@@ -32,21 +33,13 @@ class TestSerialAttenuator:
     
     def test_send_command_success(self, mock_serial_attenuator):
         """测试成功发送命令"""
-        # 模拟串口数据读取：第一次有数据，后续都没有数据（避免无限循环）
-        from unittest.mock import PropertyMock
-        
-        call_count = 0
-        def mock_in_waiting():
-            nonlocal call_count
-            call_count += 1
-            return 5 if call_count == 1 else 0
-            
-        type(mock_serial_attenuator.serial_conn).in_waiting = PropertyMock(side_effect=mock_in_waiting)
-        mock_serial_attenuator.serial_conn.read.return_value = b'OK\r\n'
+        mock_serial_attenuator.serial_conn.read_until.return_value = b'OK\r\n'
         
         response = mock_serial_attenuator.send_command('ATT 10')
         
-        mock_serial_attenuator.serial_conn.write.assert_called_once()
+        mock_serial_attenuator.serial_conn.reset_input_buffer.assert_called_once()
+        mock_serial_attenuator.serial_conn.write.assert_called_once_with(b'ATT 10\r\n')
+        mock_serial_attenuator.serial_conn.read_until.assert_called_once_with(b'\r\n')
         assert response == 'OK'
     
     def test_send_command_timeout(self, mock_serial_attenuator):
@@ -65,37 +58,17 @@ class TestSerialAttenuator:
     
     def test_set_attenuation_valid_range(self, mock_serial_attenuator):
         """测试设置有效范围内的衰减值"""
-        # 模拟串口数据读取：第一次有数据，第二次没有数据（避免无限循环）
-        from unittest.mock import PropertyMock
-        
-        call_count = 0
-        def mock_in_waiting():
-            nonlocal call_count
-            call_count += 1
-            return 5 if call_count == 1 else 0
-            
-        type(mock_serial_attenuator.serial_conn).in_waiting = PropertyMock(side_effect=mock_in_waiting)
-        mock_serial_attenuator.serial_conn.read.return_value = b'OK\r\n'
+        mock_serial_attenuator.serial_conn.read_until.return_value = b'OK\r\n'
         
         result = mock_serial_attenuator.set_attenuation(15.5)
         
         assert result is True
         # 验证发送的命令包含衰减值
-        mock_serial_attenuator.serial_conn.write.assert_called_once()
+        mock_serial_attenuator.serial_conn.write.assert_called_once_with(b'att-015.50\r\n')
     
     def test_set_attenuation_below_minimum(self, mock_serial_attenuator):
         """测试设置低于最小值的衰减"""
-        # 模拟串口数据读取，避免无限循环
-        from unittest.mock import PropertyMock
-        
-        call_count = 0
-        def mock_in_waiting():
-            nonlocal call_count
-            call_count += 1
-            return 5 if call_count == 1 else 0
-            
-        type(mock_serial_attenuator.serial_conn).in_waiting = PropertyMock(side_effect=mock_in_waiting)
-        mock_serial_attenuator.serial_conn.read.return_value = b'OK\r\n'
+        mock_serial_attenuator.serial_conn.read_until.return_value = b'OK\r\n'
         
         # SerialAttenuator不进行范围检查，直接设置
         result = mock_serial_attenuator.set_attenuation(-1.0)
@@ -103,17 +76,7 @@ class TestSerialAttenuator:
     
     def test_set_attenuation_above_maximum(self, mock_serial_attenuator):
         """测试设置高于最大值的衰减"""
-        # 模拟串口数据读取，避免无限循环
-        from unittest.mock import PropertyMock
-        
-        call_count = 0
-        def mock_in_waiting():
-            nonlocal call_count
-            call_count += 1
-            return 5 if call_count == 1 else 0
-            
-        type(mock_serial_attenuator.serial_conn).in_waiting = PropertyMock(side_effect=mock_in_waiting)
-        mock_serial_attenuator.serial_conn.read.return_value = b'OK\r\n'
+        mock_serial_attenuator.serial_conn.read_until.return_value = b'OK\r\n'
         
         # SerialAttenuator不进行范围检查，直接设置
         result = mock_serial_attenuator.set_attenuation(100.0)
@@ -129,17 +92,7 @@ class TestSerialAttenuator:
     
     def test_get_attenuation_success(self, mock_serial_attenuator):
         """测试成功获取衰减值"""
-        # 模拟串口数据读取：第一次有数据，第二次没有数据（避免无限循环）
-        from unittest.mock import PropertyMock
-        
-        call_count = 0
-        def mock_in_waiting():
-            nonlocal call_count
-            call_count += 1
-            return 5 if call_count == 1 else 0
-            
-        type(mock_serial_attenuator.serial_conn).in_waiting = PropertyMock(side_effect=mock_in_waiting)
-        mock_serial_attenuator.serial_conn.read.return_value = b'ATT 15.5\r\n'
+        mock_serial_attenuator.serial_conn.read_until.return_value = b'ATT 15.5\r\n'
         
         attenuation = mock_serial_attenuator.read_attenuation()
         
@@ -148,17 +101,7 @@ class TestSerialAttenuator:
     
     def test_get_attenuation_invalid_response(self, mock_serial_attenuator):
         """测试获取衰减值时响应格式无效"""
-        # 模拟串口数据读取：第一次有数据，第二次没有数据（避免无限循环）
-        from unittest.mock import PropertyMock
-        
-        call_count = 0
-        def mock_in_waiting():
-            nonlocal call_count
-            call_count += 1
-            return 5 if call_count == 1 else 0
-            
-        type(mock_serial_attenuator.serial_conn).in_waiting = PropertyMock(side_effect=mock_in_waiting)
-        mock_serial_attenuator.serial_conn.read.return_value = b'INVALID\r\n'
+        mock_serial_attenuator.serial_conn.read_until.return_value = b'INVALID\r\n'
         
         attenuation = mock_serial_attenuator.read_attenuation()
         
@@ -173,6 +116,20 @@ class TestSerialAttenuator:
         
         assert attenuation is None
     
+    def test_display_attenuation_cached_per_file_signature(self, mock_serial_attenuator):
+        """测试显示值按(实际值, 频率, 补偿文件签名)复用，文件被替换后即使修改时间相同也重新计算"""
+        compensator = Mock(current_frequency=1000.0, file_signature=(1, 100))
+        compensator.compensate_attenuation_for_reading.return_value = 10.5
+        mock_serial_attenuator.current_attenuation = 10.0
+        
+        assert mock_serial_attenuator.display_attenuation(compensator) == 10.5
+        assert mock_serial_attenuator.display_attenuation(compensator) == 10.5
+        assert compensator.compensate_attenuation_for_reading.call_count == 1
+        
+        compensator.file_signature = (2, 100)
+        mock_serial_attenuator.display_attenuation(compensator)
+        assert compensator.compensate_attenuation_for_reading.call_count == 2
+    
     def test_connect_success(self, mock_serial_attenuator):
         """测试成功连接"""
         with patch('serial.Serial') as mock_serial_class:
@@ -188,6 +145,21 @@ class TestSerialAttenuator:
             result = mock_serial_attenuator.connect()
             assert result is True
             assert mock_serial_attenuator.is_connected is True
+            assert mock_serial_class.call_args.kwargs['timeout'] == mock_serial_attenuator.timeout
+    
+    @pytest.mark.parametrize("error", [None, OSError("not supported"), AttributeError("no ioctl")])
+    def test_connect_low_latency(self, error):
+        """测试启用低延迟模式，驱动不支持时仍然连接成功"""
+        mock_serial_instance = Mock()
+        mock_serial_instance.is_open = True
+        mock_serial_instance.set_low_latency_mode.side_effect = error
+        
+        with patch('serial.Serial', return_value=mock_serial_instance):
+            attenuator = SerialAttenuator('/dev/ttyUSB0', low_latency=True)
+            assert attenuator.connect() is True
+        
+        mock_serial_instance.set_low_latency_mode.assert_called_once_with(True)
+        assert attenuator.is_connected is True
     
     def test_connect_failure(self):
         """测试连接失败"""
@@ -204,6 +176,31 @@ class TestSerialAttenuator:
         mock_serial_attenuator.serial_conn.close.assert_called_once()
         assert mock_serial_attenuator.is_connected is False
     
+    def test_disconnect_waits_for_pending_command(self, mock_serial_attenuator):
+        """测试断开连接等待进行中的命令完成后才关闭串口"""
+        reading = threading.Event()
+        release = threading.Event()
+        
+        def slow_read(*args):
+            reading.set()
+            release.wait(timeout=2)
+            return b'OK\r\n'
+        
+        mock_serial_attenuator.serial_conn.read_until.side_effect = slow_read
+        sender = threading.Thread(target=mock_serial_attenuator.send_command, args=('READ',))
+        sender.start()
+        assert reading.wait(timeout=2)
+        
+        closer = threading.Thread(target=mock_serial_attenuator.disconnect)
+        closer.start()
+        closer.join(timeout=0.1)
+        mock_serial_attenuator.serial_conn.close.assert_not_called()
+        
+        release.set()
+        sender.join(timeout=2)
+        closer.join(timeout=2)
+        mock_serial_attenuator.serial_conn.close.assert_called_once()
+    
     def test_disconnect_exception(self, mock_serial_attenuator):
         """测试断开连接时发生异常"""
         mock_serial_attenuator.serial_conn.close.side_effect = Exception("Close error")
@@ -0,0 +1,72 @@
+import pytest
+
+from tests._helpers import assert_ok
+
+
+class TestAttenuationApi:
+    """测试批量衰减值和最小衰减值接口"""
+    
+    def test_set_all_attenuation_success(self, client, mock_controller_for_web):
+        """测试成功设置所有设备衰减值"""
+        mock_controller_for_web.set_all_attenuation.return_value = {'att_1': True}
+        mock_controller_for_web.get_min_attenuation.return_value = 0.5
+        mock_controller_for_web.get_frequency.return_value = 2000
+        # 模拟有连接的衰减器
+        mock_attenuator = type('MockAttenuator', (), {})() 
+        mock_controller_for_web.attenuators = {'att_1': mock_attenuator}
+        
+        response = client.post('/api/set_attenuation', json={'value': 15.5})
+        
+        data = assert_ok(response)
+        assert 'data' in data
+    
+    def test_set_all_attenuation_invalid(self, client, mock_controller_for_web):
+        """测试设置无效衰减值"""
+        mock_controller_for_web.get_min_attenuation.return_value = 0.5
+        mock_controller_for_web.get_frequency.return_value = 2000
+        mock_controller_for_web.attenuators = {'att_1': 'mock'}
+        
+        response = client.post('/api/set_attenuation', json={'value': -5.0})
+        
+        assert response.status_code == 400
+        data = response.json()
+        assert 'detail' in data
+    
+    def test_get_all_attenuation(self, client, mock_controller_for_web):
+        """测试获取所有设备衰减值"""
+        response = client.get('/api/get_attenuation')
+        
+        data = assert_ok(response)
+        assert 'data' in data
+        assert 'attenuations' in data['data']
+    
+    def test_get_min_attenuation(self, client, mock_controller_for_web):
+        """测试获取最小衰减值"""
+        mock_controller_for_web.get_min_attenuation.return_value = {'COM1': 0.5, 'COM2': 1.0}
+        mock_controller_for_web.get_frequency.return_value = 2000
+        
+        response = client.get('/api/get_min_attenuation')
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert 'success' in data
+        assert 'data' in data
+        # 检查data中的内容
+        assert data['data']['frequency'] == 2000
+        assert data['data']['min_attenuation'] == {'COM1': 0.5, 'COM2': 1.0}
+    
+    def test_get_attenuation_range_not_modified(self, client, mock_controller_for_web):
+        """测试衰减值范围未变化时条件请求返回304，最小衰减值变化后返回新内容"""
+        mock_controller_for_web.get_min_attenuation.return_value = 0.5
+        
+        response = client.get('/api/get_attenuation_range')
+        etag = response.headers['etag']
+        
+        response = client.get('/api/get_attenuation_range', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        
+        # 补偿文件更新导致最小衰减值变化（频率未变）
+        mock_controller_for_web.get_min_attenuation.return_value = 0.8
+        response = client.get('/api/get_attenuation_range', headers={'If-None-Match': etag})
+        data = assert_ok(response)
+        assert data['data']['min_attenuation'] == 0.8
@@ -0,0 +1,82 @@
+import pytest
+
+from tests._helpers import assert_ok
+
+
+class TestConnectApi:
+    """测试串口扫描和设备连接/断开接口"""
+    
+    def test_scan_ports_endpoint(self, client, mock_controller_for_web):
+        """测试扫描串口端点"""
+        response = client.get('/api/scan_ports')
+        
+        data = assert_ok(response)
+        assert 'data' in data
+        assert 'ports' in data['data']
+        assert len(data['data']['ports']) == 3
+        assert 'COM1' in data['data']['ports']
+    
+    def test_scan_ports_reflects_port_changes(self, client, mock_controller_for_web):
+        """测试端口列表变化后扫描结果随之更新"""
+        assert_ok(client.get('/api/scan_ports'))
+        mock_controller_for_web.scan_serial_ports.return_value = ['/dev/ttyACM0']
+        
+        data = assert_ok(client.get('/api/scan_ports'))
+        assert data['data']['ports'] == ['/dev/ttyACM0']
+        assert '1' in data['message']
+    
+    @pytest.mark.parametrize("connected", [True, False])
+    def test_connect_device(self, client, mock_controller_for_web, connected):
+        """测试连接设备成功/失败时返回对应的success"""
+        mock_controller_for_web.connect_attenuator.return_value = connected
+        
+        response = client.post('/api/connect', json={'ports': ['COM1']})
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data['success'] is connected
+        assert 'message' in data
+    
+    def test_connect_multiple_devices(self, client, mock_controller_for_web):
+        """测试并行连接多个设备时结果按端口顺序对应设备ID"""
+        mock_controller_for_web.connect_attenuator.side_effect = lambda port, device_id: port != 'COM2'
+        
+        response = client.post('/api/connect', json={'ports': ['COM1', 'COM2', 'COM3']})
+        
+        data = assert_ok(response)
+        assert data['data']['devices'] == {
+            'attenuator_1': {'port': 'COM1', 'connected': True},
+            'attenuator_2': {'port': 'COM2', 'connected': False},
+            'attenuator_3': {'port': 'COM3', 'connected': True},
+        }
+        assert mock_controller_for_web.connect_attenuator.call_count == 3
+        mock_controller_for_web.order_devices.assert_called_once_with(['attenuator_1', 'attenuator_2', 'attenuator_3'])
+    
+    def test_connect_device_missing_port(self, client):
+        """测试缺少端口参数"""
+        response = client.post('/api/connect', json={})
+        
+        assert response.status_code == 422  # Validation error
+    
+    def test_connect_device_unknown_field(self, client, mock_controller_for_web):
+        """测试请求体包含未知字段时返回校验错误"""
+        response = client.post('/api/connect', json={'ports': ['COM1'], 'baudrate': 115200})
+        
+        assert response.status_code == 422
+        mock_controller_for_web.connect_attenuator.assert_not_called()
+    
+    def test_disconnect_device_success(self, client, mock_controller_for_web):
+        """测试成功断开设备"""
+        response = client.post('/api/disconnect')
+        
+        assert_ok(response)
+    
+    def test_disconnect_device_failure(self, client, mock_controller_for_web):
+        """测试断开设备失败"""
+        mock_controller_for_web.disconnect_all.side_effect = Exception("Disconnect failed")
+        
+        response = client.post('/api/disconnect')
+        
+        assert response.status_code == 500
+        data = response.json()
+        assert 'detail' in data
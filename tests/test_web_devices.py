@@ -0,0 +1,147 @@
+import pytest
+
+from tests._helpers import assert_ok
+
+
+class TestDevicesApi:
+    """测试设备状态和单设备衰减接口"""
+    
+    def test_get_connected_devices(self, client, mock_controller_for_web):
+        """测试获取已连接设备列表"""
+        mock_controller_for_web.get_device_status.return_value = {
+            'att_1': {
+                'port': 'COM1',
+                'connected': True,
+                'current_attenuation': 10.5
+            }
+        }
+        
+        response = client.get('/api/devices')
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert 'success' in data
+        assert 'data' in data
+    
+    @pytest.mark.parametrize("device_id,result", [('att_1', True), ('att_999', False)])
+    def test_set_device_attenuation(self, client, mock_controller_for_web, device_id, result):
+        """测试设置单个设备衰减成功/失败时返回对应的success"""
+        mock_controller_for_web.set_attenuation_by_device_id.return_value = result
+        
+        response = client.post('/api/attenuators/set', json={'device_id': device_id, 'value': 12.5})
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data['success'] is result
+        assert 'message' in data
+        assert data['data']['device_id'] == device_id
+        assert data['data']['target_value'] == 12.5
+
+    def test_set_device_attenuation_no_response(self, client, mock_controller_for_web):
+        """测试设置后设备读取无响应时返回失败，响应只包含模型定义的字段"""
+        mock_controller_for_web.get_attenuation_by_device_id.return_value = None
+
+        response = client.post('/api/attenuators/set', json={'device_id': 'att_1', 'value': 12.5})
+
+        assert response.status_code == 200
+        assert response.json() == {'success': False, 'message': '设备 att_1 无响应', 'data': None}
+
+    def test_get_device_attenuation_success(self, client, mock_controller_for_web):
+        """测试成功获取单个设备衰减"""
+        response = client.get('/api/attenuators/att_1')
+        
+        data = assert_ok(response)
+        assert 'data' in data
+    
+    def test_get_device_attenuation_not_found(self, client, mock_controller_for_web):
+        """测试获取不存在设备的衰减值"""
+        mock_controller_for_web.get_attenuation_by_device_id.side_effect = KeyError("Device not found")
+        
+        response = client.get('/api/attenuators/att_999')
+        
+        assert response.status_code == 500
+        data = response.json()
+        assert 'detail' in data
+    
+    @pytest.mark.parametrize("status,expected_devices", [
+        (
+            {'att_1': {'port': 'COM1', 'connected': True, 'current_attenuation': 10.5}},
+            [{'device_id': 'att_1', 'port': 'COM1', 'connected': True, 'current_attenuation': 10.5}]
+        ),
+        ({}, []),
+    ], ids=['connected', 'not_connected'])
+    def test_get_device_status(self, client, mock_controller_for_web, status, expected_devices):
+        """测试获取已连接/未连接设备状态"""
+        mock_controller_for_web.get_device_status.return_value = status
+        
+        response = client.get('/api/devices')
+        
+        data = assert_ok(response)
+        assert data['data']['devices'] == expected_devices
+    
+    def test_system_status_cached_until_revision_changes(self, client, mock_controller_for_web):
+        """测试状态版本号不变时复用系统状态，版本号变化后重新获取"""
+        first = assert_ok(client.get('/api/status'))
+        assert first['data']['device_list'] == ['COM1', 'COM2']
+        
+        mock_controller_for_web.get_connected_devices.return_value = ['COM1']
+        assert assert_ok(client.get('/api/status')) == first
+        assert mock_controller_for_web.get_connected_devices.call_count == 1
+        
+        mock_controller_for_web.revision += 1
+        data = assert_ok(client.get('/api/status'))
+        assert data['data']['device_list'] == ['COM1']
+        assert data['data']['connected_devices'] == 1
+    
+    def test_state_events_push_on_change(self, mock_controller_for_web, monkeypatch):
+        """测试SSE事件流连接时推送当前状态，状态变化通知后再次推送"""
+        import asyncio
+        import json
+        import web_server
+        
+        monkeypatch.setattr(web_server, '_state_changed', asyncio.Event())
+        monkeypatch.setattr(web_server, '_shutdown_event', asyncio.Event())
+        mock_controller_for_web.get_device_status.return_value = {
+            'att_1': {'port': 'COM1', 'connected': True, 'current_attenuation': 10.5}
+        }
+        
+        async def read_two():
+            events = web_server._state_events(mock_controller_for_web)
+            first = await events.__anext__()
+            mock_controller_for_web.get_frequency.return_value = 2000.0
+            web_server.notify_state_changed()
+            second = await asyncio.wait_for(events.__anext__(), timeout=1)
+            await events.aclose()
+            return first, second
+        
+        first, second = asyncio.run(read_two())
+        
+        assert first.startswith(b'data: ') and first.endswith(b'\n\n')
+        first_data = json.loads(first[len(b'data: '):])['data']
+        assert first_data['devices'][0]['device_id'] == 'att_1'
+        assert json.loads(second[len(b'data: '):])['data']['frequency'] == 2000.0
+    
+    def test_state_events_end_on_shutdown(self, mock_controller_for_web, monkeypatch):
+        """测试应用关闭时正在等待状态变化的SSE事件流立即结束，不阻塞关闭流程"""
+        import asyncio
+        from unittest.mock import patch
+        import web_server
+        
+        monkeypatch.setattr(web_server.app.state, 'controller', None)
+        mock_controller_for_web.get_device_status.return_value = {}
+        
+        async def run():
+            async with web_server.lifespan(web_server.app):
+                events = web_server._state_events(mock_controller_for_web)
+                await events.__anext__()
+                pending = asyncio.ensure_future(events.__anext__())
+                await asyncio.sleep(0)
+                assert not pending.done()
+            # 关闭流程结束后事件流已终止
+            with pytest.raises(StopAsyncIteration):
+                await asyncio.wait_for(pending, timeout=1)
+        
+        with patch('web_server.create_controller', return_value=mock_controller_for_web):
+            asyncio.run(run())
+        
+        mock_controller_for_web.disconnect_all.assert_called_once()
@@ -0,0 +1,54 @@
+import pytest
+
+from tests._helpers import assert_ok
+
+
+class TestFrequencyApi:
+    """测试工作频率接口"""
+    
+    def test_set_frequency_success(self, client, mock_controller_for_web):
+        """测试成功设置频率"""
+        response = client.post('/api/set_frequency', json={'frequency': 2500})
+        
+        assert_ok(response)
+    
+    def test_set_frequency_invalid(self, client, mock_controller_for_web):
+        """测试设置无效频率"""
+        mock_controller_for_web.set_frequency.side_effect = ValueError("Invalid frequency")
+        
+        response = client.post('/api/set_frequency', json={'frequency': -100})
+        
+        assert response.status_code == 400
+        data = response.json()
+        assert 'detail' in data
+    
+    def test_get_frequency(self, client, mock_controller_for_web):
+        """测试获取当前频率"""
+        response = client.get('/api/get_frequency')
+        
+        data = assert_ok(response)
+        assert 'data' in data
+        assert 'frequency' in data['data']
+    
+    def test_get_frequency_not_modified(self, client, mock_controller_for_web):
+        """测试状态版本号未变化时条件请求返回304，变化后返回新内容"""
+        response = client.get('/api/get_frequency')
+        etag = response.headers['etag']
+        
+        response = client.get('/api/get_frequency', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.content == b''
+        
+        mock_controller_for_web.revision += 1
+        response = client.get('/api/get_frequency', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['etag'] != etag
+    
+    def test_get_frequency_etag_not_reused_after_restart(self, client, mock_controller_for_web, monkeypatch):
+        """测试服务重启后状态版本号相同时，重启前的ETag也不会命中"""
+        etag = client.get('/api/get_frequency').headers['etag']
+        
+        monkeypatch.setattr('web_server._BOOT_ID', 'restarted')
+        response = client.get('/api/get_frequency', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['etag'] == 'W/"restarted-0"'
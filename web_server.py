@@ -5,32 +5,50 @@ WCS衰减器控制Web服务器
 使用FastAPI提供RESTful API和Web界面
 """
 
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, HTTPException, Request, Response, Depends
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from pydantic import BaseModel
-from typing import List, Dict, Optional
+from pydantic import BaseModel, ConfigDict
+from typing import List, Dict, Optional, Tuple
+from typing_extensions import TypedDict
 import uvicorn
 import logging
 import asyncio
+import gzip
 import json
+import uuid
+from contextlib import asynccontextmanager
+from functools import lru_cache
 from pathlib import Path
+from urllib.parse import parse_qs
 
 from serial_attenuator import MultiAttenuatorController
 
+# 优先使用orjson解析配置、序列化API响应（C实现，速度更快），未安装时回退到标准库
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse as _DefaultResponse
+    _json_loads = orjson.loads
+except ImportError:
+    _DefaultResponse = JSONResponse
+    _json_loads = json.loads
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 项目根目录（导入时解析一次，供配置文件、静态文件和模板目录共用）
+_BASE_DIR = Path(__file__).resolve().parent
+
 
 # 读取配置文件
+@lru_cache(maxsize=1)
 def load_config():
-    """加载配置文件"""
-    config_file = Path(__file__).parent / "config.json"
+    """加载配置文件（结果会被缓存，需要重新读取时调用load_config.cache_clear()）"""
+    config_file = _BASE_DIR / "config.json"
     try:
-        with open(config_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return _json_loads(config_file.read_bytes())
     except Exception as e:
         logger.warning(f"加载配置文件失败: {e}，使用默认配置")
         return {}
@@ -40,222 +58,389 @@ def load_config():
 config = load_config()
 json_file = config.get("frequency", {}).get("json_file", "1.json")
 
+# 启动时的后台串口扫描任务（保留引用，避免任务未完成时被回收）
+_startup_scan_task: Optional[asyncio.Task] = None
+
+
+def create_controller() -> MultiAttenuatorController:
+    """根据配置文件创建控制器实例"""
+    serial_config = config.get("serial", {})
+    return MultiAttenuatorController(
+        json_file,
+        low_latency=serial_config.get("low_latency", False),
+        timeout=serial_config.get("timeout", 2.0)
+    )
+
+
+async def _scan_ports_in_background(controller: MultiAttenuatorController):
+    """在线程池中扫描串口，不阻塞事件循环"""
+    try:
+        ports = await asyncio.to_thread(controller.scan_serial_ports)
+        logger.info(f"启动时发现 {len(ports)} 个串口设备")
+    except Exception as e:
+        logger.error(f"启动时扫描串口失败: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时创建控制器并后台扫描串口，关闭时断开所有设备"""
+    global _startup_scan_task, _state_changed, _shutdown_event
+    logger.info("WCS衰减器控制系统启动")
+
+    # SSE通知使用的Event在当前事件循环中重新创建
+    _state_changed = asyncio.Event()
+    _shutdown_event = asyncio.Event()
+
+    # 控制器在应用启动时创建（而非导入模块时），各接口通过get_controller从app.state获取
+    controller = create_controller()
+    app.state.controller = controller
+
+    # 自动扫描串口（后台执行，服务无需等待扫描完成即可响应请求）
+    _startup_scan_task = asyncio.create_task(_scan_ports_in_background(controller))
+
+    yield
+
+    logger.info("正在关闭系统...")
+    # 先结束所有SSE事件流，再断开设备
+    _close_state_events()
+
+    try:
+        controller.disconnect_all()
+        logger.info("已断开所有设备连接")
+    except Exception as e:
+        logger.error(f"关闭时断开连接失败: {e}")
+
+
 # 创建FastAPI应用
 app = FastAPI(
     title="WCS衰减器控制系统",
     description="通过Web界面控制多个串口衰减器设备",
-    version="1.1.1"
+    version="1.1.1",
+    default_response_class=_DefaultResponse,
+    lifespan=lifespan
 )
 
+class CachedStaticFiles(StaticFiles):
+    """版本参数（?v=...）与当前静态文件版本一致的请求允许浏览器长期缓存，版本变化即为新URL"""
+
+    def __init__(self, *args, version: str, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.version = version
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        # 旧版本或随意填写的v参数仍按默认头部返回，避免把其他内容长期缓存在该URL下
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        if query.get("v") == [self.version]:
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+
+def _compute_static_version(directory: Path) -> str:
+    """根据静态文件的最新修改时间生成版本号，文件更新后页面引用的URL随之变化"""
+    latest = max((f.stat().st_mtime_ns for f in directory.rglob("*") if f.is_file()), default=0)
+    return format(latest, "x")
+
+
 # 挂载静态文件 - 使用绝对路径
-static_dir = Path(__file__).parent / "static"
-templates_dir = Path(__file__).parent / "templates"
-app.mount("/static", StaticFiles(directory=str(static_dir)), name="static")
+static_dir = _BASE_DIR / "static"
+templates_dir = _BASE_DIR / "templates"
+# 静态文件版本号（启动时计算一次），模板中作为?v=参数
+static_version = _compute_static_version(static_dir)
+app.mount("/static", CachedStaticFiles(directory=str(static_dir), version=static_version), name="static")
 
 # 模板引擎 - 使用绝对路径
-templates = Jinja2Templates(directory=str(templates_dir))
+# 关闭auto_reload：模板编译后常驻内存，每次请求不再stat检查文件是否变更（修改模板后需重启服务）
+templates = Jinja2Templates(directory=str(templates_dir), auto_reload=False)
+
+# 控制器实例，由lifespan在应用启动时创建
+app.state.controller = None
+
 
-# 全局控制器实例
-controller = MultiAttenuatorController(json_file)
+def get_controller(request: Request) -> MultiAttenuatorController:
+    """API依赖：获取控制器实例（测试中可通过app.dependency_overrides替换）"""
+    return request.app.state.controller
 
 
 # Pydantic模型
-class AttenuationAndIdRequest(BaseModel):
+class _RequestModel(BaseModel):
+    """请求体模型基类：拒绝未知字段，解析后不可修改"""
+    model_config = ConfigDict(extra='forbid', frozen=True)
+
+
+class AttenuationAndIdRequest(_RequestModel):
     device_id: str
     value: float
 
 
-class AttenuationRequest(BaseModel):
+class AttenuationRequest(_RequestModel):
     value: float
 
 
-class FrequencyRequest(BaseModel):
+class FrequencyRequest(_RequestModel):
     frequency: float
 
 
-class ConnectRequest(BaseModel):
+class ConnectRequest(_RequestModel):
     ports: List[str]
 
 
-class DeviceResponse(BaseModel):
-    device_id: str
-    port: str
-    connected: bool
-    current_attenuation: Optional[float] = None
-
-
 class ApiResponse(BaseModel):
     success: bool
     message: str
     data: Optional[Dict] = None
 
 
+def api_response(success: bool, message: str, data: Optional[Dict] = None) -> Dict:
+    """构建与ApiResponse结构相同的普通字典，供高频查询接口使用，省去一次pydantic模型校验"""
+    return {"success": success, "message": message, "data": data}
+
+
+# 本进程的启动标识：状态版本号每次启动都从0开始，ETag中加入该标识，重启前的ETag不会误命中
+_BOOT_ID = uuid.uuid4().hex
+
+
+def revision_tag(controller: MultiAttenuatorController) -> str:
+    """以启动标识和控制器状态版本号组成ETag版本，仅在本进程内有效"""
+    return f"{_BOOT_ID}-{controller.revision}"
+
+
+def check_not_modified(request: Request, response: Response, version) -> Optional[Response]:
+    """条件GET：以version（状态版本号或内容摘要）生成ETag，客户端ETag未过期时返回304响应，否则为响应设置ETag"""
+    etag = f'W/"{version}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    # 允许浏览器缓存但每次都需携带ETag重新验证
+    response.headers["Cache-Control"] = "no-cache"
+    return None
+
+
 # 新增单设备设置请求模型（如果已有可复用）
-class SingleAttenuationSetRequest(BaseModel):
+class SingleAttenuationSetRequest(_RequestModel):
     device_id: str  # 设备ID（如 "att_1"）
     value: float  # 目标衰减值（用户输入的原始值）
 
 
+class SingleAttenuationData(TypedDict):
+    """单设备设置接口的data字段（固定结构，校验比通用Dict更快，文档也更精确）"""
+    device_id: str
+    target_value: float
+    current_value: Optional[float]
+    message: str
+
+
+class SingleAttenuationResponse(ApiResponse):
+    data: Optional[SingleAttenuationData] = None
+
+
 class DeviceIdListResponse(BaseModel):
     """设备ID列表响应模型"""
     device_ids: List[str]
 
 
+# 预渲染的主页面：(原始HTML, gzip压缩后的HTML)，模板内容与请求无关，首次访问时渲染一次
+_index_page: Optional[tuple] = None
+
+
+def _render_index_page() -> tuple:
+    """渲染主页面并预先gzip压缩"""
+    html = templates.get_template("index.html").render(static_version=static_version).encode("utf-8")
+    return html, gzip.compress(html, 9)
+
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    """按Accept-Encoding的编码名和q值判断客户端是否接受gzip：显式列出gzip时以其q值为准，否则参考*的q值"""
+    gzip_q = None
+    wildcard_q = None
+    for item in accept_encoding.split(","):
+        coding, *params = item.split(";")
+        coding = coding.strip().lower()
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    # 无法解析的q值按不接受处理
+                    q = 0.0
+        if coding in ("gzip", "x-gzip"):
+            gzip_q = q if gzip_q is None else max(gzip_q, q)
+        elif coding == "*":
+            wildcard_q = q
+    if gzip_q is None:
+        gzip_q = wildcard_q
+    return gzip_q is not None and gzip_q > 0
+
+
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
-    """主页面"""
-    return templates.TemplateResponse("index.html", {"request": request})
+    """主页面（返回预渲染内容，客户端支持时直接发送gzip压缩版本）"""
+    global _index_page
+    if _index_page is None:
+        _index_page = _render_index_page()
+    html, compressed = _index_page
+
+    # 压缩和未压缩的响应都带Vary，缓存按Accept-Encoding分别保存
+    headers = {"Vary": "Accept-Encoding"}
+    if _accepts_gzip(request.headers.get("accept-encoding", "")):
+        headers["Content-Encoding"] = "gzip"
+        return HTMLResponse(content=compressed, headers=headers)
+    return HTMLResponse(content=html, headers=headers)
+
+
+# 扫描串口接口复用上次枚举结果的最长时间（秒），避免页面频繁刷新时反复遍历sysfs
+_SCAN_PORTS_MAX_AGE = 1.0
+
+# 最近一次扫描结果的已序列化响应体：(端口元组, JSON字节)，端口列表不变时直接复用
+_scan_response_cache: Optional[tuple] = None
 
 
 @app.get("/api/scan_ports")
-async def scan_ports():
+async def scan_ports(controller: MultiAttenuatorController = Depends(get_controller)):
     """扫描可用串口"""
-    try:
-        ports = controller.scan_serial_ports()
-        return ApiResponse(
+    global _scan_response_cache
+    ports = tuple(await asyncio.to_thread(controller.scan_serial_ports, max_age=_SCAN_PORTS_MAX_AGE))
+    cache = _scan_response_cache
+    if cache is None or cache[0] != ports:
+        body = _DefaultResponse(api_response(
             success=True,
             message=f"发现 {len(ports)} 个串口设备",
-            data={"ports": ports}
-        )
-    except Exception as e:
-        logger.error(f"扫描串口失败: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+            data={"ports": list(ports)}
+        )).body
+        cache = _scan_response_cache = (ports, body)
+    return Response(content=cache[1], media_type="application/json")
 
 
 @app.post("/api/connect")
-async def connect_devices(request: ConnectRequest):
+async def connect_devices(request: ConnectRequest, controller: MultiAttenuatorController = Depends(get_controller)):
     """连接衰减器设备"""
-    try:
-        # 先断开所有现有连接
-        controller.disconnect_all()
-
-        results = {}
-        connected_count = 0
-
-        for i, port in enumerate(request.ports):
-            device_id = f"attenuator_{i + 1}"
-            success = controller.connect_attenuator(port, device_id)
-            results[device_id] = {
-                "port": port,
-                "connected": success
-            }
-            if success:
-                connected_count += 1
-
-        return ApiResponse(
-            success=connected_count > 0,
-            message=f"成功连接 {connected_count}/{len(request.ports)} 个设备",
-            data={"devices": results}
-        )
-
-    except Exception as e:
-        logger.error(f"连接设备失败: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    # 先断开所有现有连接
+    await asyncio.to_thread(controller.disconnect_all)
+
+    # 各端口在线程池中并行打开，总耗时取决于最慢的一个设备而非所有设备之和
+    device_ids = [f"attenuator_{i + 1}" for i in range(len(request.ports))]
+    successes = await asyncio.gather(*(
+        asyncio.to_thread(controller.connect_attenuator, port, device_id)
+        for port, device_id in zip(request.ports, device_ids)
+    ))
+    # 设备按连接完成的先后注册，这里恢复为请求中的端口顺序
+    controller.order_devices(device_ids)
+
+    results = {
+        device_id: {"port": port, "connected": success}
+        for device_id, port, success in zip(device_ids, request.ports, successes)
+    }
+    connected_count = sum(1 for success in successes if success)
+    notify_state_changed()
+
+    return ApiResponse.model_construct(
+        success=connected_count > 0,
+        message=f"成功连接 {connected_count}/{len(request.ports)} 个设备",
+        data={"devices": results}
+    )
 
 
 @app.post("/api/disconnect")
-async def disconnect_all():
+async def disconnect_all(controller: MultiAttenuatorController = Depends(get_controller)):
     """断开所有设备连接"""
-    try:
-        controller.disconnect_all()
-        return ApiResponse(
-            success=True,
-            message="已断开所有设备连接"
-        )
-    except Exception as e:
-        logger.error(f"断开连接失败: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    await asyncio.to_thread(controller.disconnect_all)
+    notify_state_changed()
+    return ApiResponse.model_construct(
+        success=True,
+        message="已断开所有设备连接"
+    )
+
+
+def _device_list(status: Dict[str, Dict]) -> List[Dict]:
+    """将控制器的设备状态转换为接口返回的设备列表"""
+    return [
+        {
+            "device_id": device_id,
+            "port": info["port"],
+            "connected": info["connected"],
+            "current_attenuation": info["current_attenuation"]
+        }
+        for device_id, info in status.items()
+    ]
 
 
 @app.get("/api/devices")
-async def get_devices():
+async def get_devices(controller: MultiAttenuatorController = Depends(get_controller)):
     """获取设备状态"""
-    try:
-        status = controller.get_device_status()
-        devices = []
-
-        for device_id, info in status.items():
-            devices.append(DeviceResponse(
-                device_id=device_id,
-                port=info["port"],
-                connected=info["connected"],
-                current_attenuation=info["current_attenuation"]
-            ))
-
-        return ApiResponse(
-            success=True,
-            message=f"获取到 {len(devices)} 个设备信息",
-            data={"devices": [device.dict() for device in devices]}
-        )
+    devices = _device_list(controller.get_device_status())
 
-    except Exception as e:
-        logger.error(f"获取设备状态失败: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    return api_response(
+        success=True,
+        message=f"获取到 {len(devices)} 个设备信息",
+        data={"devices": devices}
+    )
 
 
-@app.post("/api/set_attenuation")
-async def set_attenuation(request: AttenuationRequest):
-    """批量设置衰减值"""
-    try:
-        if not controller.attenuators:
-            raise HTTPException(status_code=400, detail="没有连接的设备")
+# 衰减器可设置的最大衰减值（dB）
+_MAX_ATTENUATION = 90.0
 
-        # 获取当前频率下的最小衰减值
-        min_attenuation = controller.get_min_attenuation()
 
-        # 验证衰减值范围（使用动态最小值）
-        if not (min_attenuation <= request.value <= 90.0):
-            raise HTTPException(
-                status_code=400,
-                detail=f"衰减值必须在{min_attenuation}-90dB范围内（当前频率{controller.get_frequency()}MHz的最小值为{min_attenuation}dB）"
-            )
+def _current_range(controller: MultiAttenuatorController) -> Tuple[float, float, float]:
+    """返回当前频率下的 (最小衰减值, 最大衰减值, 频率)
+
+    最小衰减值由补偿器按频率缓存，补偿文件重新加载时自动失效，这里不再另加一层缓存。
+    """
+    min_attenuation, frequency = controller.get_min_attenuation_and_frequency()
+    return min_attenuation, _MAX_ATTENUATION, frequency
 
-        results = controller.set_all_attenuation(request.value)
 
-        success_count = sum(1 for success in results.values() if success)
-        total_count = len(results)
+@app.post("/api/set_attenuation")
+async def set_attenuation(request: AttenuationRequest, controller: MultiAttenuatorController = Depends(get_controller)):
+    """批量设置衰减值"""
+    if not controller.attenuators:
+        raise HTTPException(status_code=400, detail="没有连接的设备")
 
-        return ApiResponse(
-            success=success_count > 0,
-            message=f"成功设置 {success_count}/{total_count} 个设备",
-            data={
-                "target_value": request.value,
-                "results": results,
-                "min_attenuation": min_attenuation
-            }
+    # 获取当前频率下的最小衰减值
+    min_attenuation, max_attenuation, frequency = _current_range(controller)
+
+    # 验证衰减值范围（使用动态最小值）
+    if not (min_attenuation <= request.value <= max_attenuation):
+        raise HTTPException(
+            status_code=400,
+            detail=f"衰减值必须在{min_attenuation}-{max_attenuation:g}dB范围内（当前频率{frequency}MHz的最小值为{min_attenuation}dB）"
         )
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"设置衰减值失败: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    results = await asyncio.to_thread(controller.set_all_attenuation, request.value)
+    notify_state_changed()
+
+    success_count = sum(results.values())
+    total_count = len(results)
+
+    return ApiResponse.model_construct(
+        success=success_count > 0,
+        message=f"成功设置 {success_count}/{total_count} 个设备",
+        data={
+            "target_value": request.value,
+            "results": results,
+            "min_attenuation": min_attenuation
+        }
+    )
 
 
 @app.get("/api/get_attenuation")
-async def get_attenuation():
+async def get_attenuation(controller: MultiAttenuatorController = Depends(get_controller)):
     """获取所有设备的衰减值"""
-    try:
-        if not controller.attenuators:
-            raise HTTPException(status_code=400, detail="没有连接的设备")
-
-        values = controller.get_all_attenuation()
+    if not controller.attenuators:
+        raise HTTPException(status_code=400, detail="没有连接的设备")
 
-        return ApiResponse(
-            success=True,
-            message="获取衰减值成功",
-            data={"attenuations": values}
-        )
+    values = await asyncio.to_thread(controller.get_all_attenuation)
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"获取衰减值失败: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    return api_response(
+        success=True,
+        message="获取衰减值成功",
+        data={"attenuations": values}
+    )
 
 
-@app.post("/api/attenuators/set", response_model=ApiResponse)
-async def set_single_attenuation(request: SingleAttenuationSetRequest):
+@app.post("/api/attenuators/set", response_model=SingleAttenuationResponse)
+async def set_single_attenuation(request: SingleAttenuationSetRequest, controller: MultiAttenuatorController = Depends(get_controller)):
     """
     设置指定衰减器的衰减值（用户接口）
     """
@@ -268,7 +453,8 @@ async def set_single_attenuation(request: SingleAttenuationSetRequest):
             )
 
         # 调用控制器设置单设备
-        success = controller.set_attenuation_by_device_id(
+        success = await asyncio.to_thread(
+            controller.set_attenuation_by_device_id,
             device_id=request.device_id,
             target_value=request.value
         )
@@ -281,10 +467,11 @@ async def set_single_attenuation(request: SingleAttenuationSetRequest):
         }
 
         if success:
+            notify_state_changed()
             response_data["message"] = f"设备 {request.device_id} 设置成功"
 
             # 获取实际显示值（需根据硬件反馈修正）
-            current_value = controller.get_attenuation_by_device_id(request.device_id)
+            current_value = await asyncio.to_thread(controller.get_attenuation_by_device_id, request.device_id)
             if current_value is not None:
                 response_data["current_value"] = current_value
             else:
@@ -296,213 +483,271 @@ async def set_single_attenuation(request: SingleAttenuationSetRequest):
             response_data["message"] = f"设备 {request.device_id} 设置失败"
 
         # 统一返回结构
-        return ApiResponse(
+        return SingleAttenuationResponse.model_construct(
             success=success,
             message=response_data["message"],
             data=response_data
         )
 
     except HTTPException as e:
-        return ApiResponse(
+        return SingleAttenuationResponse.model_construct(
             success=False,
-            message=str(e.detail),
-            code=e.status_code
+            message=str(e.detail)
         )
     except Exception as e:
         logger.error(f"单设备设置接口异常: {e}")
-        return ApiResponse(
+        return SingleAttenuationResponse.model_construct(
             success=False,
-            message="服务器内部错误",
-            code=500
+            message="服务器内部错误"
         )
 
 
-@app.get("/api/attenuators/{device_id}", response_model=ApiResponse)
-async def get_single_attenuation(device_id: str):
+@app.get("/api/attenuators/{device_id}")
+async def get_single_attenuation(device_id: str, controller: MultiAttenuatorController = Depends(get_controller)):
     """
     获取指定衰减器的当前衰减值（用户接口）
     """
-    try:
-        current_value = controller.get_attenuation_by_device_id(device_id)
-
-        if current_value is None:
-            if device_id not in controller.attenuators:
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"设备 {device_id} 未连接"
-                )
-            else:
-                raise HTTPException(
-                    status_code=503,
-                    detail=f"设备 {device_id} 无响应"
-                )
+    current_value = await asyncio.to_thread(controller.get_attenuation_by_device_id, device_id)
 
-        return ApiResponse(
-            success=True,
-            message=f"获取设备 {device_id} 衰减值成功",
-            data={"device_id": device_id, "current_attenuation": current_value}
-        )
+    if current_value is None:
+        if device_id not in controller.attenuators:
+            raise HTTPException(
+                status_code=404,
+                detail=f"设备 {device_id} 未连接"
+            )
+        else:
+            raise HTTPException(
+                status_code=503,
+                detail=f"设备 {device_id} 无响应"
+            )
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"单设备查询接口异常: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    return api_response(
+        success=True,
+        message=f"获取设备 {device_id} 衰减值成功",
+        data={"device_id": device_id, "current_attenuation": current_value}
+    )
 
 
-@app.get("/api/devices/ids", response_model=ApiResponse)
-async def get_all_device_ids():
+@app.get("/api/devices/ids")
+async def get_all_device_ids(controller: MultiAttenuatorController = Depends(get_controller)):
     """
     获取所有已连接设备的ID列表（新增接口）
     """
-    try:
-        # 调用控制器获取设备ID列表
-        device_ids = controller.get_connected_devices()
-
-        return ApiResponse(
-            success=True,
-            message=f"获取到 {len(device_ids)} 个设备ID",
-            data={"device_ids": device_ids}
-        )
+    # 调用控制器获取设备ID列表
+    device_ids = controller.get_connected_devices()
 
-    except Exception as e:
-        logger.error(f"获取设备ID列表失败: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    return api_response(
+        success=True,
+        message=f"获取到 {len(device_ids)} 个设备ID",
+        data={"device_ids": device_ids}
+    )
 
 
 @app.post("/api/set_frequency")
-async def set_frequency(request: FrequencyRequest):
+async def set_frequency(request: FrequencyRequest, controller: MultiAttenuatorController = Depends(get_controller)):
     """设置工作频率"""
-    try:
-        # 验证频率范围
-        if not (1 <= request.frequency <= 8000):
-            raise HTTPException(status_code=400, detail="频率必须在1-8000MHz范围内")
+    # 验证频率范围
+    if not (1 <= request.frequency <= 8000):
+        raise HTTPException(status_code=400, detail="频率必须在1-8000MHz范围内")
+
+    # 频率切换需等待进行中的批量设置/读取完成，在线程池中执行以免阻塞事件循环
+    await asyncio.to_thread(controller.set_frequency, request.frequency)
+    notify_state_changed()
+
+    return ApiResponse.model_construct(
+        success=True,
+        message=f"设置频率成功: {request.frequency}MHz",
+        data={"frequency": request.frequency}
+    )
 
-        controller.set_frequency(request.frequency)
 
-        return ApiResponse(
-            success=True,
-            message=f"设置频率成功: {request.frequency}MHz",
-            data={"frequency": request.frequency}
-        )
+@app.get("/api/get_frequency")
+async def get_frequency(request: Request, response: Response,
+                        controller: MultiAttenuatorController = Depends(get_controller)):
+    """获取当前工作频率（支持ETag条件请求）"""
+    not_modified = check_not_modified(request, response, revision_tag(controller))
+    if not_modified is not None:
+        return not_modified
+
+    frequency = controller.get_frequency()
+
+    return api_response(
+        success=True,
+        message="获取频率成功",
+        data={"frequency": frequency}
+    )
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"设置频率失败: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/get_min_attenuation")
+async def get_min_attenuation(controller: MultiAttenuatorController = Depends(get_controller)):
+    """获取当前频率下的最小衰减值"""
+    min_attenuation, _, frequency = _current_range(controller)
+
+    return api_response(
+        success=True,
+        message="获取最小衰减值成功",
+        data={
+            "min_attenuation": min_attenuation,
+            "frequency": frequency
+        }
+    )
 
-@app.get("/api/get_frequency")
-async def get_frequency():
-    """获取当前工作频率"""
-    try:
-        frequency = controller.get_frequency()
 
-        return ApiResponse(
-            success=True,
-            message="获取频率成功",
-            data={"frequency": frequency}
-        )
+@app.get("/api/get_attenuation_range")
+async def get_attenuation_range(request: Request, response: Response,
+                                controller: MultiAttenuatorController = Depends(get_controller)):
+    """获取当前频率下的衰减值范围（支持ETag条件请求）"""
+    min_attenuation, max_attenuation, frequency = _current_range(controller)
+    # 最小衰减值还取决于补偿文件内容，直接以返回的数值生成ETag，补偿文件重新加载后同样失效
+    not_modified = check_not_modified(request, response, f"{frequency}:{min_attenuation}")
+    if not_modified is not None:
+        return not_modified
+
+    return api_response(
+        success=True,
+        message="获取衰减值范围成功",
+        data={
+            "min_attenuation": min_attenuation,
+            "max_attenuation": max_attenuation,
+            "frequency": frequency,
+            "range_text": f"{min_attenuation} - {max_attenuation} dB"
+        }
+    )
 
-    except Exception as e:
-        logger.error(f"获取频率失败: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
 
+# 系统状态响应缓存：(控制器, 状态版本号, 响应字典)，版本号变化前直接复用
+_status_cache: Optional[tuple] = None
 
-@app.get("/api/get_min_attenuation")
-async def get_min_attenuation():
-    """获取当前频率下的最小衰减值"""
-    try:
-        min_attenuation = controller.get_min_attenuation()
-        frequency = controller.get_frequency()
 
-        return ApiResponse(
-            success=True,
-            message="获取最小衰减值成功",
-            data={
-                "min_attenuation": min_attenuation,
-                "frequency": frequency
-            }
-        )
+@app.get("/api/status")
+async def get_system_status(request: Request, response: Response,
+                            controller: MultiAttenuatorController = Depends(get_controller)):
+    """获取系统状态（支持ETag条件请求，状态未变化时复用上次组装的响应）"""
+    global _status_cache
+    not_modified = check_not_modified(request, response, revision_tag(controller))
+    if not_modified is not None:
+        return not_modified
+
+    revision = controller.revision
+    cache = _status_cache
+    if cache is not None and cache[0] is controller and cache[1] == revision:
+        return cache[2]
+
+    connected_devices = controller.get_connected_devices()
+    current_frequency = controller.get_frequency()
+
+    payload = api_response(
+        success=True,
+        message="获取系统状态成功",
+        data={
+            "connected_devices": len(connected_devices),
+            "device_list": connected_devices,
+            "current_frequency": current_frequency,
+            "available_ports": controller.available_ports
+        }
+    )
+    _status_cache = (controller, revision, payload)
+    return payload
 
-    except Exception as e:
-        logger.error(f"获取最小衰减值失败: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
 
+# SSE连接无状态变化时发送心跳的间隔（秒），避免代理或浏览器因空闲断开连接
+_SSE_KEEPALIVE_INTERVAL = 15.0
 
-@app.get("/api/get_attenuation_range")
-async def get_attenuation_range():
-    """获取当前频率下的衰减值范围"""
-    try:
-        min_attenuation = controller.get_min_attenuation()
-        frequency = controller.get_frequency()
+# 状态变化通知：每次变化时触发当前Event并换成新的Event，各SSE连接等待的是推送前取到的Event
+_state_changed = asyncio.Event()
 
-        return ApiResponse(
-            success=True,
-            message="获取衰减值范围成功",
-            data={
-                "min_attenuation": min_attenuation,
-                "max_attenuation": 90.0,
-                "frequency": frequency,
-                "range_text": f"{min_attenuation} - 90.0 dB"
-            }
-        )
 
-    except Exception as e:
-        logger.error(f"获取衰减值范围失败: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+# 应用关闭标志：置位后所有SSE事件流立即结束
+_shutdown_event = asyncio.Event()
 
 
-@app.get("/api/status")
-async def get_system_status():
-    """获取系统状态"""
-    try:
-        connected_devices = controller.get_connected_devices()
-        current_frequency = controller.get_frequency()
+def notify_state_changed():
+    """通知所有SSE连接设备状态或频率已变化"""
+    global _state_changed
+    event, _state_changed = _state_changed, asyncio.Event()
+    event.set()
 
-        return ApiResponse(
-            success=True,
-            message="获取系统状态成功",
-            data={
-                "connected_devices": len(connected_devices),
-                "device_list": connected_devices,
-                "current_frequency": current_frequency,
-                "available_ports": controller.available_ports
-            }
-        )
 
-    except Exception as e:
-        logger.error(f"获取系统状态失败: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+def _close_state_events():
+    """应用关闭时结束所有SSE事件流：置位关闭标志并唤醒正在等待状态变化的连接"""
+    _shutdown_event.set()
+    notify_state_changed()
 
 
-@app.on_event("startup")
-async def startup_event():
-    """应用启动事件"""
-    logger.info("WCS衰减器控制系统启动")
+def _state_snapshot(controller: MultiAttenuatorController) -> bytes:
+    """构建一条SSE消息：当前设备列表和工作频率（只读取控制器缓存的状态，不访问串口）"""
+    payload = api_response(
+        success=True,
+        message="状态更新",
+        data={
+            "devices": _device_list(controller.get_device_status()),
+            "frequency": controller.get_frequency()
+        }
+    )
+    return b"data: " + _DefaultResponse(payload).body + b"\n\n"
+
+
+async def _state_events(controller: MultiAttenuatorController):
+    """SSE事件流：连接时推送一次当前状态，之后仅在状态变化时推送，应用关闭时结束"""
+    shutdown = _shutdown_event
+    while not shutdown.is_set():
+        event = _state_changed
+        yield _state_snapshot(controller)
+        while True:
+            try:
+                await asyncio.wait_for(event.wait(), timeout=_SSE_KEEPALIVE_INTERVAL)
+                break
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+
+
+@app.get("/api/events")
+async def state_events(controller: MultiAttenuatorController = Depends(get_controller)):
+    """以Server-Sent Events推送设备状态和频率变化，页面无需定时轮询"""
+    return StreamingResponse(
+        _state_events(controller),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
 
-    # 自动扫描串口
-    try:
-        ports = controller.scan_serial_ports()
-        logger.info(f"启动时发现 {len(ports)} 个串口设备")
-    except Exception as e:
-        logger.error(f"启动时扫描串口失败: {e}")
 
+# 异常处理
+class UnhandledErrorMiddleware:
+    """统一处理接口中未捕获的异常：记录日志并返回500 JSON响应（各接口无需再单独try/except）"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        response_started = False
+
+        async def send_wrapper(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            # 响应已开始发送时无法再改写状态码，交由服务器处理
+            if response_started:
+                raise
+            logger.exception("%s %s 处理失败: %s", scope["method"], scope["path"], e)
+            response = _DefaultResponse(
+                status_code=500,
+                content={"success": False, "message": str(e), "detail": str(e)}
+            )
+            await response(scope, receive, send)
 
-@app.on_event("shutdown")
-async def shutdown_event():
-    """应用关闭事件"""
-    logger.info("正在关闭系统...")
 
-    try:
-        controller.disconnect_all()
-        logger.info("已断开所有设备连接")
-    except Exception as e:
-        logger.error(f"关闭时断开连接失败: {e}")
+app.add_middleware(UnhandledErrorMiddleware)
 
 
-# 异常处理
 @app.exception_handler(404)
 async def not_found_handler(request: Request, exc):
     # 只对API路径返回JSON错误，静态文件路径返回默认404
@@ -515,14 +760,6 @@ async def not_found_handler(request: Request, exc):
     raise exc
 
 
-@app.exception_handler(500)
-async def internal_error_handler(request: Request, exc):
-    return JSONResponse(
-        status_code=500,
-        content={"success": False, "message": "服务器内部错误"}
-    )
-
-
 def main():
     """主函数"""
     import argparse
@@ -531,9 +768,13 @@ def main():
     parser.add_argument("--host", default="0.0.0.0", help="服务器地址")
     parser.add_argument("--port", type=int, default=8000, help="服务器端口")
     parser.add_argument("--reload", action="store_true", help="开发模式自动重载")
+    parser.add_argument("--log-level", default="info",
+                        choices=["debug", "info", "warning", "error"],
+                        help="日志级别（生产环境可设为warning，跳过逐请求的info日志）")
 
     args = parser.parse_args()
 
+    logging.getLogger().setLevel(args.log_level.upper())
     logger.info(f"启动Web服务器: http://{args.host}:{args.port}")
 
     uvicorn.run(
@@ -541,7 +782,11 @@ def main():
         host=args.host,
         port=args.port,
         reload=args.reload,
-        log_level="info"
+        # 模板关闭了auto_reload，开发模式下模板文件变化时同样重启服务
+        reload_includes=["*.html"] if args.reload else None,
+        log_level=args.log_level,
+        # uvicorn先等待所有连接关闭再执行lifespan关闭流程，SSE长连接需超时取消，才能断开设备
+        timeout_graceful_shutdown=config.get("server", {}).get("graceful_shutdown_timeout", 3.0)
     )
 
 